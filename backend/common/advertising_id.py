@@ -0,0 +1,15 @@
+import re
+
+# iOS IDFA and Android advertising IDs are both 8-4-4-4-12 hex strings
+ADVERTISING_ID_PATTERN = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}',
+    re.IGNORECASE
+)
+
+ZERO_ADVERTISING_ID = "00000000-0000-0000-0000-000000000000"
+
+def validate_advertising_id(ad_id) -> bool:
+    """
+    Validates the format of the advertising ID.
+    """
+    return isinstance(ad_id, str) and ADVERTISING_ID_PATTERN.fullmatch(ad_id) is not None
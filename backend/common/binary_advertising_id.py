@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import uuid
+from bson.binary import Binary, UuidRepresentation, UUID_SUBTYPE
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .advertising_id import validate_advertising_id
+
+logger = logging.getLogger(__name__)
+
+# Advertising IDs are stored as 16-byte BSON Binary UUIDs (subtype 4) rather
+# than 36-character strings: documents and index entries shrink by more than
+# half, and upper- and lower-case spellings of an ID become the same value.
+
+def to_binary_advertising_id(ad_id: str) -> Binary:
+    """
+    Converts an advertising ID string to its stored form. Raises ValueError
+    if the ID is malformed.
+    """
+    if not validate_advertising_id(ad_id):
+        raise ValueError("Invalid advertising ID format")
+    return Binary.from_uuid(uuid.UUID(ad_id), UuidRepresentation.STANDARD)
+
+def to_string_advertising_id(value) -> str:
+    """
+    Converts a stored advertising ID back to its canonical lower-case string.
+    Rows not migrated yet still hold the original string.
+    """
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(value.as_uuid(UuidRepresentation.STANDARD))
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value.lower() if isinstance(value, str) else value
+
+def advertising_id_filter(ad_id: str):
+    """
+    Query value matching an advertising ID in either stored form, so reads
+    stay correct while the string-to-binary migration is still running.
+    """
+    if not validate_advertising_id(ad_id):
+        return ad_id
+    return {"$in": list({to_binary_advertising_id(ad_id), ad_id, ad_id.lower()})}
+
+async def _resolve_duplicate(collection, document: dict, binary: Binary):
+    # The most recently updated spelling wins, as in dedupe_user_records.py
+    kept = await collection.find_one(
+        {"user_id": document.get("user_id"), "advertising_id": binary}, {"status": 1, "updated_at": 1}
+    )
+    if kept is None:
+        return False
+    if document.get("updated_at") and (not kept.get("updated_at") or document["updated_at"] > kept["updated_at"]):
+        await collection.update_one(
+            {"_id": kept["_id"]}, {"$set": {"status": document.get("status"), "updated_at": document["updated_at"]}}
+        )
+    await collection.delete_one({"_id": document["_id"], "advertising_id": document["advertising_id"]})
+    return True
+
+async def migrate_advertising_ids(collection, batch_size: int = 1000, pause: float = 0.1,
+                                  delete_duplicates: bool = False):
+    """
+    Rewrites string advertising IDs in collection as binary UUIDs, one batch
+    at a time and in _id order. Each update is conditional on the string it
+    read, so rows changed concurrently by the app are left alone and picked
+    up by the next run. Malformed IDs are logged and kept as they are.
+
+    Two spellings of one ID (e.g. upper- and lower-case) become the same
+    binary value, which a unique index refuses. Such rows are left as
+    strings and counted as duplicates; with delete_duplicates, for
+    collections keyed by (user_id, advertising_id) like devices, the
+    string twin is deleted instead, after carrying its status over if it
+    was updated more recently. Returns (migrated, skipped, duplicates).
+    """
+    migrated = skipped = duplicates = 0
+    last_id = None
+    while True:
+        query = {"advertising_id": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(
+            query, {"advertising_id": 1, "user_id": 1, "status": 1, "updated_at": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        operations, converted = [], []
+        for document in batch:
+            try:
+                binary = to_binary_advertising_id(document["advertising_id"])
+            except ValueError:
+                logger.warning(f"Skipping malformed advertising ID on {document['_id']}")
+                skipped += 1
+                continue
+            operations.append(UpdateOne(
+                {"_id": document["_id"], "advertising_id": document["advertising_id"]},
+                {"$set": {"advertising_id": binary}}
+            ))
+            converted.append((document, binary))
+        if operations:
+            try:
+                result = await collection.bulk_write(operations, ordered=False)
+                migrated += result.modified_count
+            except BulkWriteError as e:
+                migrated += e.details.get("nModified", 0)
+                errors = e.details.get("writeErrors", [])
+                unexpected = [error for error in errors if error.get("code") != 11000]
+                if unexpected:
+                    raise
+                for error in errors:
+                    document, binary = converted[error["index"]]
+                    if delete_duplicates and await _resolve_duplicate(collection, document, binary):
+                        logger.info(f"Removed {document['_id']}, a second spelling of an already migrated advertising ID")
+                    else:
+                        logger.warning(f"Left {document['_id']} as a string: its binary form would duplicate another row")
+                    duplicates += 1
+        logger.info(f"Migrated {migrated} advertising IDs in {collection.name} so far")
+        # Leave room for production traffic between batches
+        await asyncio.sleep(pause)
+    return migrated, skipped, duplicates
@@ -0,0 +1,74 @@
+import hashlib
+import hmac
+from passlib.context import CryptContext
+
+_bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HMACCodeHasher:
+    """
+    Keyed HMAC-SHA256 for short-lived one-time codes. The server secret is what
+    makes the small code space safe, so this costs microseconds instead of a
+    full bcrypt round.
+    """
+    scheme = "hmac-sha256"
+    prefix = "$hmac-sha256$"
+    blocking = False
+
+    def __init__(self, secret: str):
+        self._key = secret.encode()
+
+    def hash(self, code: str) -> str:
+        return self.prefix + hmac.new(self._key, code.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, code: str, hashed_code: str) -> bool:
+        return hmac.compare_digest(self.hash(code), hashed_code)
+
+    def identify(self, hashed_code: str) -> bool:
+        return hashed_code.startswith(self.prefix)
+
+
+class BcryptCodeHasher:
+    """
+    The original scheme, kept so codes issued before the switch still verify
+    until they expire. blocking tells async callers to run it off the loop.
+    """
+    scheme = "bcrypt"
+    blocking = True
+
+    def hash(self, code: str) -> str:
+        return _bcrypt.hash(code)
+
+    def verify(self, code: str, hashed_code: str) -> bool:
+        return _bcrypt.verify(code, hashed_code)
+
+    def identify(self, hashed_code: str) -> bool:
+        return hashed_code.startswith("$2")
+
+
+def build_code_hashers(scheme: str, secret: str = None):
+    """
+    Returns (hasher for new codes, {scheme: hasher} for verifying stored
+    ones). Raises ValueError for an unknown scheme, or for hmac-sha256
+    without a secret, so a misconfigured app fails at startup instead of
+    quietly issuing bcrypt codes.
+    """
+    hashers = {BcryptCodeHasher.scheme: BcryptCodeHasher()}
+    if secret:
+        hashers[HMACCodeHasher.scheme] = HMACCodeHasher(secret)
+    if scheme == HMACCodeHasher.scheme and not secret:
+        raise ValueError("Code hash scheme hmac-sha256 needs a secret")
+    if scheme not in hashers:
+        raise ValueError(f"Unknown code hash scheme {scheme!r}")
+    return hashers[scheme], hashers
+
+def identify_hasher(hashers: dict, hashed_code: str):
+    """
+    Returns the hasher that issued hashed_code, or None.
+    """
+    if not hashed_code:
+        return None
+    for hasher in hashers.values():
+        if hasher.identify(hashed_code):
+            return hasher
+    return None
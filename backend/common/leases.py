@@ -0,0 +1,111 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class MongoLease:
+    """
+    A named lease stored as one document in a Mongo collection, so only one
+    process across the fleet holds it at a time:
+
+        {_id: name, owner, token, expires_at, completed}
+
+    Every acquisition increments token. The token is a fencing token: writes
+    made under the lease should be conditional on it (e.g. a filter like
+    {"fence": {"$lte": lease.token}} that sets fence to the token). Then a
+    holder that stalled past expiry can't overwrite work done under a newer
+    lease. Renewals keep the token.
+
+    A lease released with completed=True can't be acquired again, which makes
+    it a run-once marker (name it after the run, e.g. "daily_job:2024-01-31").
+
+    Expiry is written with the caller's clock, so ttl_seconds should be well
+    above the clock skew between hosts. The holder also stops trusting the
+    lease ttl_seconds after its last renewal by its own monotonic clock.
+    """
+
+    def __init__(self, collection, name: str, owner: str, ttl_seconds: float = 60):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl_seconds
+        self.token = None
+        self.lost = False
+        self._valid_until = 0.0
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None and not self.lost and time.monotonic() < self._valid_until
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        started = time.monotonic()
+        try:
+            # Matches only a free (expired) or own lease; otherwise the upsert collides on _id
+            lease = await self.collection.find_one_and_update(
+                {"_id": self.name, "completed": {"$ne": True},
+                 "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl), "acquired_at": now},
+                 "$inc": {"token": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False
+        self.token = lease["token"]
+        self.lost = False
+        self._valid_until = started + self.ttl
+        return True
+
+    async def renew(self):
+        started = time.monotonic()
+        result = await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner, "token": self.token},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}}
+        )
+        if result.matched_count == 0:
+            self.lost = True
+            raise LeaseLost(f"Lease {self.name} (token {self.token}) was taken over")
+        self._valid_until = started + self.ttl
+
+    async def release(self, completed: bool = False):
+        update = {"expires_at": datetime.utcnow()}
+        if completed:
+            update.update({"completed": True, "completed_at": datetime.utcnow()})
+        await self.collection.update_one({"_id": self.name, "owner": self.owner, "token": self.token}, {"$set": update})
+        self.token = None
+
+    async def is_completed(self) -> bool:
+        lease = await self.collection.find_one({"_id": self.name}, {"completed": 1})
+        return bool(lease and lease.get("completed"))
+
+    @asynccontextmanager
+    async def keep_alive(self):
+        """
+        Renews the lease every third of its ttl while the block runs. If a
+        renewal fails, held turns False; the block should check it before
+        each unit of work.
+        """
+        async def renew_forever():
+            while True:
+                await asyncio.sleep(self.ttl / 3)
+                try:
+                    await self.renew()
+                except LeaseLost:
+                    return
+                except Exception:
+                    # Transient errors are retried; held goes False on its own once ttl passes
+                    continue
+
+        task = asyncio.create_task(renew_forever())
+        try:
+            yield self
+        finally:
+            task.cancel()
@@ -0,0 +1,237 @@
+import bisect
+import threading
+import time
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow bcrypt/SMTP calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for labels, value in children:
+            lines.extend(self._render_child(labels, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._children[labels] = self._children.get(labels, 0) + amount
+
+    def _render_child(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._children[labels] = self._children.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._children[labels] = value
+
+    def _render_child(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"]
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram. observe() does one bisect and two additions under
+    a lock; buckets are only made cumulative when rendered.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(labels)
+            if child is None:
+                # [per-bucket counts (last one is +Inf), sum]
+                child = self._children[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            child[0][index] += 1
+            child[1] += value
+
+    def time(self, *labels, errors: Counter = None):
+        return _Timer(self, labels, errors)
+
+    def _render_child(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class StatsGauges:
+    """
+    Exposes every numeric field of a stats() dict as a gauge named
+    prefix_field, read when /metrics is scraped, e.g.
+    StatsGauges("user_cache", "User cache", user_cache.stats).
+    """
+
+    def __init__(self, prefix: str, documentation: str, stats, registry=None):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+        (REGISTRY if registry is None else registry).register(self)
+
+    def render(self):
+        lines = []
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines.extend([f"# HELP {name} {self.documentation}: {key}", f"# TYPE {name} gauge", f"{name} {value}"])
+        return lines
+
+
+class _Timer:
+    # Context manager (sync or async) recording elapsed seconds into a
+    # histogram, and counting exceptions into errors if given
+    __slots__ = ("histogram", "labels", "errors", "started")
+
+    def __init__(self, histogram, labels, errors=None):
+        self.histogram = histogram
+        self.labels = labels
+        self.errors = errors
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(*self.labels)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route", ("method", "route"))
+RESPONSES = Counter("http_responses_total", "Responses by route and status code", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+DOWNSTREAM_LATENCY = Histogram(
+    "downstream_call_duration_seconds", "Latency of calls to Mongo, bcrypt, SMTP and Supabase", ("service", "operation")
+)
+DOWNSTREAM_ERRORS = Counter("downstream_call_errors_total", "Downstream calls that raised", ("service", "operation"))
+
+def time_downstream(service: str, operation: str):
+    """
+    Times a call to another service, e.g. `with time_downstream("smtp", "send"):`
+    or `async with ...`. Exceptions are counted and re-raised.
+    """
+    return DOWNSTREAM_LATENCY.time(service, operation, errors=DOWNSTREAM_ERRORS)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, status codes and the
+    number of requests in flight. Routes are labelled by their path template
+    (e.g. /users/{user_id}), and unmatched paths share one label so the
+    label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the shared scope dict
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(elapsed, scope["method"], path)
+            RESPONSES.inc(scope["method"], path, status)
+
+
+async def metrics_endpoint():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def setup_metrics(app: FastAPI, path: str = "/metrics"):
+    """
+    Instruments app and serves every registered metric at path in Prometheus
+    text format. Metrics are per process; scrape each worker.
+    """
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
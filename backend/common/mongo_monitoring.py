@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from pymongo import monitoring
+from .metrics import DOWNSTREAM_LATENCY, DOWNSTREAM_ERRORS, Counter, Gauge, Histogram
+
+slow_query_logger = logging.getLogger("mongo.slow_query")
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled Mongo connection", ("address",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+POOL_CONNECTIONS = Gauge("mongo_pool_connections", "Open Mongo connections", ("address",))
+POOL_CHECKED_OUT = Gauge("mongo_pool_checked_out", "Mongo connections currently in use", ("address",))
+POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed, by reason", ("address", "reason")
+)
+
+# Where each command keeps the filter worth logging
+_FILTER_FIELDS = {
+    "find": lambda command: command.get("filter"),
+    "count": lambda command: command.get("query"),
+    "distinct": lambda command: command.get("query"),
+    "findAndModify": lambda command: command.get("query"),
+    "update": lambda command: [update.get("q") for update in command.get("updates", [])],
+    "delete": lambda command: [delete.get("q") for delete in command.get("deletes", [])],
+    "aggregate": lambda command: command.get("pipeline"),
+}
+
+def query_shape(value):
+    """
+    Replaces the values in a filter with "?" while keeping field names and
+    operators, so slow-query logs group by query shape and don't leak data.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Operator arrays ($and, $or, pipelines) keep their structure; value lists collapse
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return "[?]"
+    return "?"
+
+def _address(address) -> str:
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Records the server round trip of every Mongo command (find, insert,
+    update, getMore, ...) into the downstream latency histogram, and logs
+    commands slower than slow_query_ms with their filter shape. Pass it to
+    the client with event_listeners=[...], or use client_options().
+    """
+
+    def __init__(self, slow_query_ms: float = None):
+        self.slow_query_ms = slow_query_ms
+        self._commands = {}  # (connection_id, request_id) -> command, kept only while slow logging is on
+
+    def started(self, event):
+        if self.slow_query_ms is not None:
+            self._commands[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1e6
+        DOWNSTREAM_LATENCY.observe(seconds, "mongo", event.command_name)
+        if failed:
+            DOWNSTREAM_ERRORS.inc("mongo", event.command_name)
+        if self.slow_query_ms is None:
+            return
+        command, database_name = self._commands.pop((event.connection_id, event.request_id), (None, None))
+        if command is None or seconds * 1000 < self.slow_query_ms:
+            return
+        extract = _FILTER_FIELDS.get(event.command_name)
+        slow_query_logger.warning(
+            "Slow Mongo %s on %s.%s took %.1f ms",
+            event.command_name, database_name, command.get(event.command_name), seconds * 1000,
+            extra={
+                "command": event.command_name,
+                "collection": f"{database_name}.{command.get(event.command_name)}",
+                "duration_ms": round(seconds * 1000, 1),
+                "shape": query_shape(extract(command)) if extract else None,
+                "sort": query_shape(command.get("sort")) if command.get("sort") else None,
+                "failed": failed,
+            }
+        )
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks open and checked-out connections per server and how long each
+    checkout waited for a free connection. pymongo checks connections out on
+    the calling thread, so the wait is timed per thread.
+    """
+
+    def __init__(self):
+        self._checkout_started = {}
+
+    def _observe_wait(self, event):
+        started = self._checkout_started.pop((threading.get_ident(), event.address), None)
+        if started is not None:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, _address(event.address))
+
+    def connection_check_out_started(self, event):
+        self._checkout_started[(threading.get_ident(), event.address)] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._observe_wait(event)
+        POOL_CHECKED_OUT.inc(_address(event.address))
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait(event)
+        POOL_CHECKOUT_FAILURES.inc(_address(event.address), event.reason)
+
+    def connection_checked_in(self, event):
+        POOL_CHECKED_OUT.dec(_address(event.address))
+
+    def connection_created(self, event):
+        POOL_CONNECTIONS.inc(_address(event.address))
+
+    def connection_closed(self, event):
+        POOL_CONNECTIONS.dec(_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def client_options(max_pool_size: int = 100, min_pool_size: int = 0, wait_queue_timeout_ms: int = None,
+                   slow_query_ms: float = None) -> dict:
+    """
+    Keyword arguments for AsyncIOMotorClient: pool sizing plus the command
+    and pool listeners above.
+    """
+    options = {
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": min_pool_size,
+        "event_listeners": [CommandMetricsListener(slow_query_ms), PoolMetricsListener()],
+    }
+    if wait_queue_timeout_ms:
+        options["waitQueueTimeoutMS"] = wait_queue_timeout_ms
+    return options
@@ -0,0 +1,233 @@
+import ipaddress
+import logging
+import math
+import time
+from fastapi import HTTPException, Request
+from redis.exceptions import NoScriptError, RedisError
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# GCRA (generic cell rate algorithm): one key per client holds the
+# theoretical arrival time (TAT) in milliseconds. Each request pushes the TAT
+# forward by period / limit; a request is refused while the TAT is more than
+# one full period ahead of now, which gives the same budget as a sliding
+# window without storing individual hits. ARGV[3] asks for several tokens at
+# once so a worker can lease a few and hand them out locally; they are only
+# granted while the client would still have as many left afterwards, so a
+# lease never spends a client's last tokens. ARGV[4] hands back tokens from
+# a lease that expired unused. Redis' own clock is used so app servers with
+# skewed clocks agree.
+#
+# Returns {granted, retry_after_ms}.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - refund * interval
+if tat < now then
+    tat = now
+end
+local available = math.floor((now + period - tat) / interval)
+if available < 1 then
+    if refund > 0 then
+        redis.call('SET', KEYS[1], tat, 'PX', tat - now)
+    end
+    return {0, tat + interval - period - now}
+end
+local granted = 1
+if available >= 2 * wanted then
+    granted = wanted
+end
+tat = tat + granted * interval
+redis.call('SET', KEYS[1], tat, 'PX', tat - now)
+return {granted, 0}
+"""
+
+def parse_rate(rate: str):
+    """
+    Parses "5/minute" style limits into (times, seconds).
+    """
+    times, _, period = rate.partition("/")
+    return int(times), PERIODS[period.strip().rstrip("s")]
+
+def parse_trusted_proxies(value: str):
+    """
+    Parses a comma-separated list of proxy addresses or CIDR ranges, e.g.
+    "10.0.0.0/8, 127.0.0.1". Raises ValueError for a malformed entry.
+    """
+    return tuple(ipaddress.ip_network(entry.strip(), strict=False) for entry in value.split(",") if entry.strip())
+
+_trusted_proxies = ()
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+def client_ip(request: Request) -> str:
+    """
+    The peer address, unless the peer is a trusted proxy. Then X-Forwarded-For
+    is walked from the nearest hop back, and the first address that isn't a
+    trusted proxy is the client; hops further back could be forged by it.
+    """
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("X-Forwarded-For")
+    if not forwarded or not _is_trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class RateLimiter:
+    """
+    Redis-backed GCRA limiter that costs one EVALSHA per check. For limits
+    large enough that lease_fraction of them is at least two requests, a
+    worker reserves that many tokens in one call and spends them locally
+    for up to lease_seconds, so clearly-under-limit clients skip Redis most
+    of the time. Tokens are taken from Redis before they are handed out, so
+    the global limit still holds across workers. Leases are only granted
+    while the client has plenty left, and tokens from a lease that expired
+    unused are handed back with the client's next check.
+
+    If Redis is unreachable, requests are let through while fail_open is
+    set; otherwise hit() raises RedisError, which RateLimit turns into a
+    503. Routes guarding logins and codes override it to fail closed.
+    """
+
+    def __init__(self, redis_client, prefix: str = "ratelimit", lease_fraction: float = 0.05,
+                 lease_seconds: float = 1.0, max_local_keys: int = 10000, fail_open: bool = True):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.lease_fraction = lease_fraction
+        self.lease_seconds = lease_seconds
+        self.max_local_keys = max_local_keys
+        self.fail_open = fail_open
+        self._sha = None
+        self._leases = {}  # key -> [tokens left, monotonic expiry]
+        self.redis_calls = 0
+        self.local_hits = 0
+        self.refunded = 0
+
+    def _take_local(self, key: str, now: float):
+        """
+        Spends a leased token. Returns (taken, unused tokens of an expired
+        lease to hand back).
+        """
+        lease = self._leases.get(key)
+        if lease is None:
+            return False, 0
+        if lease[1] <= now or lease[0] <= 0:
+            del self._leases[key]
+            return False, lease[0]
+        lease[0] -= 1
+        self.local_hits += 1
+        return True, 0
+
+    def _store_lease(self, key: str, tokens: int, now: float):
+        if len(self._leases) >= self.max_local_keys:
+            self._leases = {k: lease for k, lease in self._leases.items() if lease[1] > now and lease[0] > 0}
+            if len(self._leases) >= self.max_local_keys:
+                return
+        self._leases[key] = [tokens, now + self.lease_seconds]
+
+    async def _evalsha(self, key: str, interval: int, period: int, wanted: int, refund: int):
+        if self._sha is None:
+            self._sha = await self.redis.script_load(GCRA_SCRIPT)
+        try:
+            return await self.redis.evalsha(self._sha, 1, key, interval, period, wanted, refund)
+        except NoScriptError:
+            # Redis was restarted or flushed its script cache
+            self._sha = await self.redis.script_load(GCRA_SCRIPT)
+            return await self.redis.evalsha(self._sha, 1, key, interval, period, wanted, refund)
+
+    async def hit(self, identifier: str, times: int, seconds: int, fail_open: bool = None):
+        """
+        Records one request for identifier. Returns 0 if it is allowed,
+        otherwise the number of milliseconds until it would be. fail_open
+        overrides the limiter's setting for this check.
+        """
+        key = f"{self.prefix}:{identifier}"
+        now = time.monotonic()
+        taken, refund = self._take_local(key, now)
+        if taken:
+            return 0
+        period = seconds * 1000
+        interval = period / times
+        wanted = max(1, int(times * self.lease_fraction))
+        self.redis_calls += 1
+        try:
+            granted, retry_after = await self._evalsha(key, math.ceil(interval), period, wanted, refund)
+        except RedisError as e:
+            if not (self.fail_open if fail_open is None else fail_open):
+                raise
+            logger.warning(f"Rate limiter unavailable, allowing request: {str(e)}")
+            return 0
+        self.refunded += refund
+        if not granted:
+            return int(retry_after)
+        if granted > 1:
+            self._store_lease(key, int(granted) - 1, now)
+        return 0
+
+
+_limiter = None
+
+def init_rate_limiter(redis_client, trusted_proxies: str = "", **options):
+    """
+    Sets up the limiter RateLimit uses. trusted_proxies lists the proxies
+    whose X-Forwarded-For client_ip believes (see parse_trusted_proxies);
+    with none, the peer address is always used.
+    """
+    global _limiter, _trusted_proxies
+    _trusted_proxies = parse_trusted_proxies(trusted_proxies)
+    _limiter = RateLimiter(redis_client, **options)
+    return _limiter
+
+def get_rate_limiter():
+    return _limiter
+
+
+class RateLimit:
+    """
+    FastAPI dependency enforcing a limit such as "5/minute" per client and
+    route, e.g. `dependencies=[Depends(RateLimit("5/minute"))]`. Does nothing
+    until init_rate_limiter has been called.
+
+    fail_open decides what happens while Redis is down: None follows the
+    limiter's setting, False refuses with 503 (for logins and verification
+    codes, where the limit is what stops guessing), and a function of the
+    request decides per route when one limit covers a whole router.
+    """
+
+    def __init__(self, rate: str, key_func=client_ip, fail_open=None):
+        self.times, self.seconds = parse_rate(rate)
+        self.key_func = key_func
+        self.fail_open = fail_open
+
+    async def __call__(self, request: Request):
+        if _limiter is None:
+            return
+        route = request.scope.get("route")
+        identifier = f"{route.path if route else request.url.path}:{self.key_func(request)}"
+        fail_open = self.fail_open(request) if callable(self.fail_open) else self.fail_open
+        try:
+            retry_after = await _limiter.hit(identifier, self.times, self.seconds, fail_open)
+        except RedisError as e:
+            logger.error(f"Rate limiter unavailable, refusing request: {str(e)}")
+            raise HTTPException(status_code=503, detail="Service Unavailable")
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(math.ceil(retry_after / 1000))}
+            )
@@ -0,0 +1,107 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every LogRecord has; anything else was passed via extra= and is
+# written out as a field of the JSON line
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, any extra=
+    fields, and the traceback if there is one.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of INFO-and-below records tagged with
+    extra={"sample": key}, e.g. {"login": 0.1} keeps one login attempt in ten.
+    Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno > logging.INFO:
+            return True
+        return random.random() < self.rates.get(key, 1.0)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # Records are formatted by the listener thread, not the caller, and are
+    # dropped rather than blocking the event loop if the queue is full
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def parse_sample_rates(value: str) -> dict:
+    """
+    Parses "login=0.1,register=0.5" into {"login": 0.1, "register": 0.5}.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        key, _, rate = item.partition("=")
+        rates[key.strip()] = float(rate)
+    return rates
+
+def setup_logging(name: str = None, level: str = "INFO", path: str = None, sample_rates: dict = None,
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, queue_size: int = 10000):
+    """
+    Routes the named logger (the root logger by default) through a queue to a
+    background thread that writes JSON lines to a rotating file at path, or to
+    stderr when path is None. Callers only pay for an enqueue; formatting,
+    file I/O and rotation all happen on the listener thread. Safe to call
+    more than once.
+    """
+    logger = logging.getLogger(name)
+    if any(isinstance(handler, _NonBlockingQueueHandler) for handler in logger.handlers):
+        return logger
+
+    if path:
+        output = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    records = queue.Queue(maxsize=queue_size)
+    handler = _NonBlockingQueueHandler(records)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    listener = QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return logger
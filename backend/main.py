@@ -1,9 +1,8 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 from dotenv import load_dotenv
+from sendgrid_transport import SendGridTransport, SENDGRID_API_URL
 import os
 import random
 import string
@@ -15,6 +14,17 @@ load_dotenv()
 sendgrid_api_key = os.getenv("SENDGRID_API_KEY")
 sendgrid_from_email = os.getenv("SENDGRID_FROM_EMAIL")
 
+# Shared across requests so connections are reused and close-together sends are batched
+sendgrid = SendGridTransport(
+    sendgrid_api_key,
+    sendgrid_from_email,
+    subject='Verify your email',
+    html_content='<strong>Your verification code is: -code-</strong><br>This code will expire in 5 minutes.',
+    api_url=os.getenv("SENDGRID_API_URL", SENDGRID_API_URL),
+    batch_window=float(os.getenv("SENDGRID_BATCH_WINDOW_MS", "50")) / 1000,
+    timeout=float(os.getenv("SENDGRID_TIMEOUT", "10")),
+)
+
 app = FastAPI()
 
 # CORS middleware setup
@@ -35,18 +45,9 @@ def generate_verification_code():
 def hash_code(code: str):
     return hashlib.sha256(code.encode()).hexdigest()
 
-def send_verification_email(to_email: str, code: str):
-    message = Mail(
-        from_email=sendgrid_from_email,
-        to_emails=to_email,
-        subject='Verify your email',
-        html_content=f'<strong>Your verification code is: {code}</strong><br>This code will expire in 5 minutes.'
-    )
+async def send_verification_email(to_email: str, code: str):
     try:
-        sg = SendGridAPIClient(sendgrid_api_key)
-        response = sg.send(message)
-        print(f"Email sent. Status Code: {response.status_code}")
-        return True
+        return await sendgrid.send(to_email, {"-code-": code})
     except Exception as e:
         print(f"Error sending email: {e}")
         return False
@@ -55,7 +56,7 @@ def send_verification_email(to_email: str, code: str):
 async def send_email(email_request: EmailSendRequest):
     verification_code = generate_verification_code()
     hashed_code = hash_code(verification_code)
-    email_sent = send_verification_email(email_request.email_address, verification_code)
+    email_sent = await send_verification_email(email_request.email_address, verification_code)
     
     if email_sent:
         return {"message": "Verification email sent successfully", "hashed_code": hashed_code}
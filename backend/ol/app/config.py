@@ -7,6 +7,21 @@ load_dotenv(override=True)
 
 # MongoDB configuration
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))  # 0 waits forever
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))  # Commands slower than this are logged
+
+# Redis configuration (shared rate limits across workers)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "30/minute")  # Per client and route
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")  # e.g. "10.0.0.0/8"; X-Forwarded-For is only read from these
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"  # False: 503 while Redis is down; verification routes always refuse
+
+# Logging configuration (JSON lines; LOG_FILE unset logs to stderr)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")  # e.g. "daily_job=0.1"
 
 # Email server configuration (Gmail SMTP server)
 EMAIL_HOST = "smtp.gmail.com"
@@ -14,6 +29,16 @@ EMAIL_PORT = 465
 EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")  # Your Gmail address
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")  # Your Gmail app password
 
+# Verification code hashing: hmac-sha256 once a secret is set (falls back to SECRET_KEY), bcrypt until then.
+# Asking for "hmac-sha256" explicitly without any secret fails at startup.
+VERIFICATION_CODE_SECRET = os.getenv("VERIFICATION_CODE_SECRET", os.getenv("SECRET_KEY"))
+VERIFICATION_CODE_HASH_SCHEME = os.getenv("VERIFICATION_CODE_HASH_SCHEME", "hmac-sha256" if VERIFICATION_CODE_SECRET else "bcrypt")
+
 # Scheduler configuration
 SCHEDULER_TIMEZONE = "UTC"
 DAILY_JOB_TIME = time(hour=0, minute=0)  # Set the time you want the job to run daily
+DAILY_JOB_BATCH_SIZE = int(os.getenv("DAILY_JOB_BATCH_SIZE", "500"))  # Users fetched per cursor batch
+DAILY_JOB_MAX_CONCURRENCY = int(os.getenv("DAILY_JOB_MAX_CONCURRENCY", "20"))  # Max users being emailed at once
+DAILY_JOB_SHARDS = int(os.getenv("DAILY_JOB_SHARDS", "1"))  # Workers that can send in parallel; 1 runs on a single worker
+DAILY_JOB_TAKEOVER_MINUTES = float(os.getenv("DAILY_JOB_TAKEOVER_MINUTES", "120"))  # How long others wait to take over a dead worker's shard
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))  # Lease expiry; renewed every third of it
@@ -1,7 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from .config import MONGODB_URI
+from common.mongo_monitoring import client_options
+from .config import MONGODB_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_SLOW_QUERY_MS
 
-client = AsyncIOMotorClient(MONGODB_URI)
+client = AsyncIOMotorClient(
+    MONGODB_URI,
+    **client_options(
+        max_pool_size=MONGO_MAX_POOL_SIZE,
+        min_pool_size=MONGO_MIN_POOL_SIZE,
+        wait_queue_timeout_ms=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        slow_query_ms=MONGO_SLOW_QUERY_MS,
+    )
+)
 db = client['ppp']
 
 def get_database():
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional
 from datetime import datetime
+from common.binary_advertising_id import to_string_advertising_id
 from ..utils.formatting import generate_uuid
 
 class UserCreate(BaseModel):
@@ -19,6 +20,12 @@ class User(UserCreate):
     email_updated_at: Optional[datetime] = None
     advertising_id_updated_at: Optional[datetime] = None
 
+    @field_validator('advertising_id', mode='before')
+    @classmethod
+    def advertising_id_to_string(cls, v):
+        # Stored as a binary UUID, returned as a string
+        return to_string_advertising_id(v) if v is not None else v
+
     class Config:
         orm_mode = True
 
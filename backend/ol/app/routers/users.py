@@ -10,8 +10,11 @@ from ..utils.security import (
     validate_advertising_id
 )
 from typing import List
+from common.binary_advertising_id import to_binary_advertising_id
 from pydantic import EmailStr
 from ..utils.email_service import send_verification_email
+from ..utils.email_scheduler import shard_hash
+from bson import ObjectId
 from datetime import datetime, timedelta
 
 router = APIRouter(
@@ -52,7 +55,12 @@ async def create_user(user: UserCreate):
         advertising_id_updated_at=now if user.advertising_id else None
     )
 
-    result = await users_collection.insert_one(new_user.dict(by_alias=True))
+    document = new_user.dict(by_alias=True)
+    document["_id"] = ObjectId()
+    document["shard_hash"] = shard_hash(document["_id"])
+    if user.advertising_id:
+        document["advertising_id"] = to_binary_advertising_id(user.advertising_id)
+    result = await users_collection.insert_one(document)
     new_user._id = str(result.inserted_id)
     return new_user
 
@@ -114,7 +122,7 @@ async def update_advertising_id(user_id: str, advertising_id: str = Body(...)):
 
     now = datetime.utcnow()
     update_data = {
-        "advertising_id": advertising_id,
+        "advertising_id": to_binary_advertising_id(advertising_id),
         "updated_at": now,
         "advertising_id_updated_at": now
     }
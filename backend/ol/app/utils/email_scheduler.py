@@ -1,8 +1,31 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from common.leases import MongoLease
 from .email_service import send_email
 from ..database import get_database
-from ..config import DAILY_JOB_TIME, SCHEDULER_TIMEZONE
+from ..config import (
+    DAILY_JOB_TIME,
+    SCHEDULER_TIMEZONE,
+    DAILY_JOB_BATCH_SIZE,
+    DAILY_JOB_MAX_CONCURRENCY,
+    DAILY_JOB_SHARDS,
+    DAILY_JOB_TAKEOVER_MINUTES,
+    JOB_LEASE_SECONDS
+)
+from datetime import datetime
 import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as a lease owner; every uvicorn worker runs its own scheduler
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 
 def start_scheduler():
     """
@@ -17,28 +40,202 @@ def start_scheduler():
     )
     scheduler.start()
 
-async def daily_email_job():
+async def ensure_job_indexes():
     """
-    Job that runs daily to send emails from each active user.
+    Expires old job leases and send records after a week.
     """
     db = get_database()
+    try:
+        await db['job_leases'].create_index("expires_at", expireAfterSeconds=7 * 24 * 3600)
+        await db['daily_email_sends'].create_index("updated_at", expireAfterSeconds=7 * 24 * 3600)
+        # Lets each shard read only its own slice of the active users
+        await db['users'].create_index([("status", 1), ("shard_hash", 1)])
+    except Exception as e:
+        logger.error(f"Job index bootstrap failed: {str(e)}")
+
+def shard_hash(user_id) -> int:
+    """
+    Stable 32-bit hash of a user: crc32 of the ObjectId bytes. Stored on the
+    user as shard_hash so shards can be selected with an indexed range query.
+    """
+    return zlib.crc32(user_id.binary)
+
+def shard_range(shard: int, shards: int):
+    """
+    The [low, high) slice of the 32-bit hash space that belongs to a shard.
+    """
+    return (shard * 2**32 + shards - 1) // shards, ((shard + 1) * 2**32 + shards - 1) // shards
+
+def user_shard(user_id, shards: int) -> int:
+    """
+    Stable shard of a user: which of the shards' hash ranges its shard_hash falls in.
+    """
+    return shard_hash(user_id) * shards >> 32
+
+async def daily_email_job(worker_id: str = WORKER_ID):
+    """
+    Job that runs daily to send emails from each active user, once across
+    every worker running the scheduler.
+
+    The active users are split into DAILY_JOB_SHARDS shards by user_id hash,
+    and each shard is guarded by a Mongo lease named after the day's run.
+    Every worker fires the job, takes whichever shard leases are free and
+    works through them, so N shards can be sent by up to N workers in
+    parallel (DAILY_JOB_SHARDS=1 means one worker sends everything). Workers
+    that find shards held by others keep retrying until those shards are
+    completed. If a holder dies, another worker picks up its shard when the
+    lease expires, until DAILY_JOB_TAKEOVER_MINUTES have passed.
+    """
+    db = get_database()
+    run_id = f"daily_email_job:{datetime.utcnow():%Y-%m-%d}"
+    deadline = time.monotonic() + DAILY_JOB_TAKEOVER_MINUTES * 60
+    shards = list(range(DAILY_JOB_SHARDS))
+
+    while True:
+        unfinished = False
+        # Workers visit shards in different orders so they spread out instead of racing for shard 0
+        random.shuffle(shards)
+        for shard in shards:
+            lease = MongoLease(db['job_leases'], f"{run_id}:shard:{shard}", worker_id, JOB_LEASE_SECONDS)
+            if not await lease.acquire():
+                unfinished = unfinished or not await lease.is_completed()
+                continue
+            logger.info("Daily email job %s: shard %d/%d acquired (token %d)", run_id, shard, DAILY_JOB_SHARDS, lease.token)
+            completed = False
+            try:
+                async with lease.keep_alive():
+                    completed = await send_shard(db, run_id, shard, lease)
+            except Exception:
+                logger.exception("Daily email job %s: shard %d failed", run_id, shard)
+            finally:
+                await lease.release(completed=completed)
+            unfinished = unfinished or not completed
+        if not unfinished or time.monotonic() > deadline:
+            return
+        await asyncio.sleep(JOB_LEASE_SECONDS)
+
+async def claim_user(sends, key: str, lease: MongoLease):
+    """
+    Records that this shard's current lease holder is about to email a user,
+    and returns the recipients already delivered to in this run (None if the
+    claim was refused). The write is fenced: it only applies if no newer
+    lease has touched the record and the user isn't already being or been
+    sent. A stale holder's claim (or a second claim by anyone) collides on
+    _id and is refused. A "failed" record can be claimed again; the retry
+    skips the recipients it already reached.
+    """
+    try:
+        record = await sends.find_one_and_update(
+            {"_id": key, "fence": {"$lte": lease.token}, "status": {"$nin": ["sending", "sent"]}},
+            {"$set": {"fence": lease.token, "status": "sending", "owner": lease.owner, "updated_at": datetime.utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return set(record.get("delivered", []))
+    except DuplicateKeyError:
+        return None
+
+async def send_shard(db, run_id: str, shard: int, lease: MongoLease) -> bool:
+    """
+    Sends the daily emails for one shard of active users. Returns False if
+    the lease was lost before the shard was done.
+
+    Only the shard's own users are read, by an indexed range query on
+    shard_hash. Users created before shard_hash existed are read by every
+    shard, filtered here, and given a shard_hash so later runs skip them.
+
+    Users are streamed from the cursor in batches and at most
+    DAILY_JOB_MAX_CONCURRENCY users are being emailed at once, so memory
+    stays flat regardless of how many active users there are. Each user is
+    claimed in daily_email_sends first and every delivered recipient is
+    recorded on the claim, so a recipient gets a user's email at most once
+    per run even across takeovers and retries of failed sends. A user whose
+    sends were interrupted by a crash stays "sending" and is skipped.
+    """
     users_collection = db['users']
-    active_users_cursor = users_collection.find({"status": "active"})
-    active_users = await active_users_cursor.to_list(length=None)
-    
-    tasks = []
-    for user in active_users:
-        from_email = user['email']
-        to_email_list = get_email_list()
-        subject = "Daily Update"
-        body = generate_email_body(user)
-        
-        for to_email in to_email_list:
-            tasks.append(
-                send_email(from_email, to_email, subject, body)
+    sends = db['daily_email_sends']
+    low, high = shard_range(shard, DAILY_JOB_SHARDS)
+    active_users_cursor = users_collection.find(
+        {"status": "active", "$or": [{"shard_hash": {"$gte": low, "$lt": high}}, {"shard_hash": None}]},
+        {"email": 1, "shard_hash": 1}
+    ).batch_size(DAILY_JOB_BATCH_SIZE)
+
+    slots = asyncio.Semaphore(DAILY_JOB_MAX_CONCURRENCY)
+    pending = set()
+    stats = {"users": 0, "sent": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+    to_email_list = get_email_list()
+    subject = "Daily Update"
+
+    async def send_user(user):
+        try:
+            key = f"{run_id}:{user['_id']}"
+            delivered = await claim_user(sends, key, lease)
+            if delivered is None:
+                stats["skipped"] += 1
+                return
+            body = generate_email_body(user)
+            failed = 0
+            for to_email in to_email_list:
+                if to_email in delivered:
+                    continue
+                try:
+                    await send_email(user['email'], to_email, subject, body)
+                    stats["sent"] += 1
+                except Exception:
+                    # send_email already logs the failure; keep going with the rest
+                    stats["failed"] += 1
+                    failed += 1
+                    continue
+                await sends.update_one(
+                    {"_id": key, "fence": lease.token},
+                    {"$addToSet": {"delivered": to_email}}
+                )
+            await sends.update_one(
+                {"_id": key, "fence": lease.token},
+                {"$set": {"status": "failed" if failed else "sent", "updated_at": datetime.utcnow()}}
             )
-    # Run all email tasks concurrently
-    await asyncio.gather(*tasks)
+        finally:
+            slots.release()
+
+    async for user in active_users_cursor:
+        if user.get('shard_hash') is None:
+            await users_collection.update_one({"_id": user['_id']}, {"$set": {"shard_hash": shard_hash(user['_id'])}})
+            if user_shard(user['_id'], DAILY_JOB_SHARDS) != shard:
+                continue
+        await slots.acquire()
+        if not lease.held:
+            slots.release()
+            logger.warning("Daily email job %s: lost the lease for shard %d, stopping", run_id, shard)
+            break
+        task = asyncio.create_task(send_user(user))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+        stats["users"] += 1
+        if stats["users"] % DAILY_JOB_BATCH_SIZE == 0:
+            log_job_progress(stats, started)
+
+    if pending:
+        await asyncio.gather(*pending)
+    log_job_progress(stats, started, finished=True)
+    return lease.held
+
+def log_job_progress(stats, started, finished=False):
+    """
+    Logs running totals and throughput for the daily email job.
+    """
+    elapsed = max(time.monotonic() - started, 1e-9)
+    logger.info(
+        "Daily email job %s: %d users (%.1f users/sec), %d emails sent (%.1f emails/sec), %d failed, %d already claimed",
+        "finished" if finished else "progress",
+        stats["users"],
+        stats["users"] / elapsed,
+        stats["sent"],
+        stats["sent"] / elapsed,
+        stats["failed"],
+        stats["skipped"]
+    )
 
 def generate_email_body(user):
     """
@@ -2,6 +2,7 @@ import aiosmtplib
 from email.message import EmailMessage
 from ..config import EMAIL_HOST, EMAIL_PORT, EMAIL_USERNAME, EMAIL_PASSWORD
 import logging
+from common.metrics import time_downstream
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +17,15 @@ async def send_email(from_email, to_email, subject, body):
     msg.set_content(body)
 
     try:
-        await aiosmtplib.send(
-            msg,
-            hostname=EMAIL_HOST,
-            port=EMAIL_PORT,
-            username=EMAIL_USERNAME,
-            password=EMAIL_PASSWORD,
-            use_tls=True
-        )
+        async with time_downstream("smtp", "send"):
+            await aiosmtplib.send(
+                msg,
+                hostname=EMAIL_HOST,
+                port=EMAIL_PORT,
+                username=EMAIL_USERNAME,
+                password=EMAIL_PASSWORD,
+                use_tls=True
+            )
         logger.info(f"Email sent successfully to {to_email}")
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
@@ -1,8 +1,18 @@
-import re
 import random
 import string
 from datetime import datetime
-from passlib.hash import bcrypt
+from common.code_hashing import build_code_hashers, identify_hasher
+from common.advertising_id import validate_advertising_id  # re-exported for the routers
+from ..config import VERIFICATION_CODE_HASH_SCHEME, VERIFICATION_CODE_SECRET
+
+# Raises at import, and so at startup, if the configured scheme can't be honoured
+CODE_HASHER, CODE_HASHERS = build_code_hashers(VERIFICATION_CODE_HASH_SCHEME, VERIFICATION_CODE_SECRET)
+
+def get_code_hasher():
+    """
+    Returns the hasher used for newly issued verification codes.
+    """
+    return CODE_HASHER
 
 def generate_verification_code(length=6):
     """
@@ -14,30 +24,18 @@ def hash_verification_code(code: str) -> str:
     """
     Hashes the verification code for secure storage.
     """
-    return bcrypt.hash(code)
+    return get_code_hasher().hash(code)
 
 def verify_verification_code(plain_code: str, hashed_code: str) -> bool:
     """
-    Verifies the provided verification code against the stored hash.
+    Verifies the provided verification code against the stored hash,
+    whichever scheme it was issued with.
     """
-    return bcrypt.verify(plain_code, hashed_code)
+    hasher = identify_hasher(CODE_HASHERS, hashed_code)
+    return hasher is not None and hasher.verify(plain_code, hashed_code)
 
 def is_verification_code_expired(expiration_time: datetime) -> bool:
     """
     Checks if the verification code has expired.
     """
     return datetime.utcnow() > expiration_time
-
-def validate_advertising_id(ad_id):
-    """
-    Validates the format of the advertising ID.
-    """
-    # UUID format (for iOS)
-    uuid_pattern = r'^[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$'
-    
-    # Android advertising ID format (16 hexadecimal characters)
-    android_pattern = r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
-    
-    if re.match(uuid_pattern, ad_id, re.IGNORECASE) or re.match(android_pattern, ad_id, re.IGNORECASE):
-        return True
-    return False
\ No newline at end of file
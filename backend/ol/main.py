@@ -1,14 +1,24 @@
-from fastapi import FastAPI
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from app.utils.email_scheduler import start_scheduler
+import redis.asyncio as redis
+from common.rate_limit import RateLimit, init_rate_limiter
+from common.structured_logging import setup_logging, parse_sample_rates
+from common.security_headers import SecurityHeadersMiddleware, DEFAULT_SECURITY_HEADERS
+from common.metrics import setup_metrics
+from app.config import (
+    REDIS_URL, RATE_LIMIT_DEFAULT, RATE_LIMIT_TRUSTED_PROXIES, RATE_LIMIT_FAIL_OPEN, LOG_LEVEL, LOG_FILE, LOG_SAMPLE_RATES
+)
+from app.utils.email_scheduler import start_scheduler, ensure_job_indexes
 from app.routers import users
 
-limiter = Limiter(key_func=get_remote_address)
-
 def create_app():
+    setup_logging(level=LOG_LEVEL, path=LOG_FILE, sample_rates=parse_sample_rates(LOG_SAMPLE_RATES))
     app = FastAPI()
     
     # Add CORS middleware
@@ -20,27 +30,28 @@ def create_app():
         allow_headers=["*"],
     )
     
-    # Add rate limiting
-    app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-    
-    # Include routers
-    app.include_router(users.router)
+    # Include routers, rate limited per client and route; the verification
+    # routes refuse requests while Redis is down instead of going unlimited
+    verification_routes = {"/users/verify-email", "/users/send-verification-email"}
+    default_limit = RateLimit(
+        RATE_LIMIT_DEFAULT, fail_open=lambda request: False if request.scope["route"].path in verification_routes else None
+    )
+    app.include_router(users.router, dependencies=[Depends(default_limit)])
     
-    # Start the scheduler when the app starts
+    # Start the scheduler and rate limiter when the app starts
     @app.on_event("startup")
     async def startup_event():
+        init_rate_limiter(
+            redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True),
+            trusted_proxies=RATE_LIMIT_TRUSTED_PROXIES, fail_open=RATE_LIMIT_FAIL_OPEN
+        )
+        await ensure_job_indexes()
+        # Every worker schedules the daily job; shard leases make sure each user is emailed once
         start_scheduler()
     
     # Add security headers middleware
-    @app.middleware("http")
-    async def add_security_headers(request, call_next):
-        response = await call_next(request)
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return response
+    app.add_middleware(SecurityHeadersMiddleware, headers=DEFAULT_SECURITY_HEADERS)
+    setup_metrics(app)
     
     return app
 
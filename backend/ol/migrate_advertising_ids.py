@@ -0,0 +1,34 @@
+"""
+Converts advertising IDs in the users collection from 36-character strings
+to binary UUIDs. Runs online in small batches and can be stopped and re-run
+at any point.
+
+    python migrate_advertising_ids.py [--batch-size 1000] [--pause 0.1]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.binary_advertising_id import migrate_advertising_ids
+from common.structured_logging import setup_logging
+from app.database import get_database
+
+async def main(batch_size: int, pause: float):
+    migrated, skipped, duplicates = await migrate_advertising_ids(get_database()['users'], batch_size, pause)
+    logging.info(
+        f"Advertising ID migration finished: {migrated} migrated, {skipped} malformed IDs left as strings, "
+        f"{duplicates} duplicate spellings left as strings"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to wait between batches")
+    args = parser.parse_args()
+    setup_logging()
+    asyncio.run(main(args.batch_size, args.pause))
@@ -0,0 +1,280 @@
+import asyncio
+import bisect
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from common.advertising_id import validate_advertising_id
+from common.binary_advertising_id import to_string_advertising_id, advertising_id_filter
+from logger import logger
+
+KEY_SIZE = 16
+PREFIX_BUCKETS = 1 << 16  # first two bytes of the key pick a bucket
+SYNC_OVERLAP_SECONDS = 5
+
+def pack_advertising_id(ad_id):
+    """
+    Packs an advertising ID into its 16 raw bytes; returns None if the ID is
+    malformed. Hex decoding makes the packed form case-insensitive. Binary
+    UUIDs read from the devices collection are already packed.
+    """
+    if isinstance(ad_id, bytes):
+        return bytes(ad_id) if len(ad_id) == KEY_SIZE else None
+    if not validate_advertising_id(ad_id):
+        return None
+    return bytes.fromhex(ad_id.replace("-", ""))
+
+
+def _split_keys(data: bytes):
+    return (data[start:start + KEY_SIZE] for start in range(0, len(data), KEY_SIZE))
+
+def _prefix_offsets(sorted_keys: list):
+    # offsets[p] = index of the first key whose two-byte prefix is >= p
+    offsets = array("I", (
+        bisect.bisect_left(sorted_keys, prefix.to_bytes(2, "big")) for prefix in range(PREFIX_BUCKETS)
+    ))
+    offsets.append(len(sorted_keys))
+    return offsets
+
+def _pack_sorted(keys):
+    keys = sorted(keys)
+    return b"".join(keys), _prefix_offsets(keys)
+
+def _build_buffers(base: bytes, added: bytes, removed: bytes):
+    """
+    Returns (sorted packed keys, prefix offsets) for base minus removed plus
+    added, each given as concatenated packed keys in any order. Runs in the
+    build process, so it only takes and returns picklable buffers.
+    """
+    keys = set(_split_keys(base))
+    keys.difference_update(_split_keys(removed))
+    keys.update(_split_keys(added))
+    return _pack_sorted(keys)
+
+_executor = None
+
+def get_executor():
+    """
+    Returns the process the index builds run in, creating it on first use.
+    Sorting millions of keys holds the GIL for seconds, which a thread
+    wouldn't take off the event loop. The process is spawned rather than
+    forked: a fork of this multithreaded process (motor, the SMTP pool)
+    could inherit a lock held by another thread and hang.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class _KeyView:
+    # Lets bisect address the packed buffer as a sequence of 16-byte keys
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // KEY_SIZE
+
+    def __getitem__(self, index: int):
+        start = index * KEY_SIZE
+        return self.data[start:start + KEY_SIZE]
+
+
+class AdvertisingIdIndex:
+    """
+    Membership index of opted-out advertising IDs. The bulk of the IDs live in
+    one sorted buffer of packed 128-bit keys with a 65536-entry prefix table,
+    so a lookup is a table read plus a short binary search. Changes since the
+    last rebuild sit in small added/removed sets that are checked first and
+    folded into the buffer once they grow past merge_threshold.
+
+    Merges and rebuilds are built in a separate process while lookups keep
+    using the current buffer. Changes made meanwhile are journaled and
+    replayed on top of the new buffer when it is swapped in, which happens
+    on the event loop thread.
+    """
+
+    def __init__(self, merge_threshold: int = 100_000):
+        self.merge_threshold = merge_threshold
+        # (keys, prefix offsets), swapped as one tuple so readers never see a half-built pair
+        self._base = (_KeyView(b""), array("I", bytes(4 * (PREFIX_BUCKETS + 1))))
+        self._added = set()
+        self._removed = set()
+        self._journal = None  # (key, present) changes made while a build is in flight
+        self._merge_task = None
+        self.ready = False
+        self.synced_at = None  # updated_at high-water mark of the last sync
+
+    def __len__(self):
+        return len(self._base[0]) - len(self._removed) + len(self._added)
+
+    def _swap(self, data: bytes, offsets, journal=()):
+        self._base = (_KeyView(data), offsets)
+        self._added = set()
+        self._removed = set()
+        for key, present in journal:
+            self._apply(key, present)
+
+    def load_keys(self, keys):
+        """
+        Replaces the index with the given packed keys (any order, duplicates
+        allowed), building in the calling thread. For scripts and benchmarks;
+        the app goes through rebuild().
+        """
+        self._swap(*_pack_sorted(set(keys)))
+        self.ready = True
+
+    async def _build_and_swap(self, base: bytes, added: bytes, removed: bytes):
+        # Whoever started the build has already opened the journal
+        loop = asyncio.get_running_loop()
+        try:
+            data, offsets = await loop.run_in_executor(get_executor(), _build_buffers, base, added, removed)
+        except BaseException:
+            self._journal = None
+            raise
+        journal, self._journal = self._journal, None
+        self._swap(data, offsets, journal)
+
+    def _in_base(self, key: bytes) -> bool:
+        keys, offsets = self._base
+        prefix = key[0] << 8 | key[1]
+        lo, hi = offsets[prefix], offsets[prefix + 1]
+        position = bisect.bisect_left(keys, key, lo, hi)
+        return position < hi and keys[position] == key
+
+    def contains_key(self, key: bytes) -> bool:
+        if key in self._added:
+            return True
+        if key in self._removed:
+            return False
+        return self._in_base(key)
+
+    def contains(self, ad_id: str) -> bool:
+        key = pack_advertising_id(ad_id)
+        return key is not None and self.contains_key(key)
+
+    def contains_many(self, ad_ids) -> list:
+        contains_key = self.contains_key
+        return [key is not None and contains_key(key) for key in map(pack_advertising_id, ad_ids)]
+
+    def _apply(self, key: bytes, present: bool):
+        if present:
+            self._removed.discard(key)
+            if not self._in_base(key):
+                self._added.add(key)
+        else:
+            self._added.discard(key)
+            if self._in_base(key):
+                self._removed.add(key)
+
+    def _change(self, ad_id: str, present: bool):
+        key = pack_advertising_id(ad_id)
+        if key is None:
+            return
+        if self._journal is not None:
+            self._journal.append((key, present))
+        self._apply(key, present)
+        self._maybe_merge()
+
+    def add(self, ad_id: str):
+        self._change(ad_id, True)
+
+    def discard(self, ad_id: str):
+        self._change(ad_id, False)
+
+    def _maybe_merge(self):
+        if self._journal is not None or len(self._added) + len(self._removed) < self.merge_threshold:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to protect (scripts, benchmarks)
+            self._swap(*_build_buffers(self._base[0].data, b"".join(self._added), b"".join(self._removed)))
+            return
+        self._journal = []
+        self._merge_task = loop.create_task(
+            self._build_and_swap(self._base[0].data, b"".join(self._added), b"".join(self._removed))
+        )
+        self._merge_task.add_done_callback(self._merge_done)
+
+    def _merge_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            # The pending sets are untouched; the next change past the threshold tries again
+            logger.error(f"Advertising ID index merge failed: {str(task.exception())}")
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "size": len(self),
+            "packed_bytes": len(self._base[0].data),
+            "pending_added": len(self._added),
+            "pending_removed": len(self._removed),
+            "building": self._journal is not None,
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+        }
+
+    async def rebuild(self, device_collection, batch_size: int = 10000):
+        """
+        Loads every active advertising ID from the devices collection.
+        """
+        if self._journal is not None:
+            # A merge is in flight; the next refresh round picks the rebuild up
+            return
+        started = datetime.utcnow()
+        # Writes made during the scan may or may not be in it; the journal replays them afterwards
+        self._journal = []
+        try:
+            keys = bytearray()
+            cursor = device_collection.find({"status": "active"}, {"advertising_id": 1, "_id": 0}).batch_size(batch_size)
+            async for device in cursor:
+                key = pack_advertising_id(device.get("advertising_id"))
+                if key is not None:
+                    keys += key
+        except BaseException:
+            self._journal = None
+            raise
+        await self._build_and_swap(b"", bytes(keys), b"")
+        self.ready = True
+        self.synced_at = started
+        logger.info(f"Advertising ID index built with {len(self)} IDs")
+
+    async def sync(self, device_collection):
+        """
+        Applies devices changed since the last sync, so workers that didn't
+        handle a write still converge.
+        """
+        started = datetime.utcnow()
+        # Overlap the previous window a little to absorb clock skew between app servers
+        query = {"updated_at": {"$gte": self.synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)}} if self.synced_at else {}
+        cursor = device_collection.find(query, {"advertising_id": 1, "status": 1, "_id": 0})
+        async for device in cursor:
+            ad_id = to_string_advertising_id(device.get("advertising_id"))
+            if device.get("status") == "active":
+                self.add(ad_id)
+            elif self.contains(ad_id) and not await device_collection.find_one(
+                {"advertising_id": advertising_id_filter(ad_id), "status": "active"}, {"_id": 1}
+            ):
+                self.discard(ad_id)
+        self.synced_at = started
+
+    async def run_refresh(self, device_collection, interval: float):
+        while True:
+            try:
+                if self.ready:
+                    await self.sync(device_collection)
+                else:
+                    await self.rebuild(device_collection)
+            except Exception as e:
+                logger.error(f"Advertising ID index refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+advertising_id_index = AdvertisingIdIndex()
@@ -1,33 +1,36 @@
-from fastapi import HTTPException, BackgroundTasks, Depends
+from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from typing import Optional
 from pydantic import EmailStr
 from jose import JWTError, jwt
 from database import (
-    get_user, create_user, update_user, store_verification_code, 
-    get_verification_code, delete_verification_code, get_user_by_id,
-    add_email, verify_email as verify_email_db, add_device
-)
-from utils import (
-    generate_verification_code, send_verification_email, 
-    send_password_reset_email, create_access_token
+    get_user, create_user, update_user, get_user_by_id,
+    add_email, verify_email as verify_email_db, add_device, enqueue_email,
+    get_unverified_email
 )
+from pymongo.errors import DuplicateKeyError
+from redis.exceptions import RedisError
+from common.rate_limit import get_rate_limiter, parse_rate
+import asyncio
+from utils import generate_verification_code, create_access_token
 from models import UserUpdate, EmailAdd, AdvertisingIdAdd, User
 from config import load_config
 from logger import logger
+import hashing
+from code_hashing import hash_code, verify_code
+from cache import user_cache
+from verification_store import get_verification_store
 
 config = load_config()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await hashing.verify_password(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await hashing.hash_password(password)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
@@ -38,33 +41,73 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
     user_dict = await get_user_by_id(user_id)
     if user_dict is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user_dict)
+    user = User(**user_dict)
+    user_cache.set(user_id, user)
+    return user
 
-async def send_and_store_verification(email: EmailStr, user_id: str, background_tasks: BackgroundTasks):
-    existing_code = await get_verification_code(email)
-    if existing_code and (datetime.utcnow() - existing_code['created_at']) < timedelta(minutes=1):
+async def send_and_store_verification(email: EmailStr, user_id: str):
+    store = get_verification_store()
+    if not await store.acquire_resend_slot(email, 60):
         raise HTTPException(status_code=429, detail="Please wait for 1 minute before requesting a new code")
 
     verification_code = generate_verification_code()
-    hashed_code = get_password_hash(verification_code)
+    hashed_code = await hash_code(verification_code)
     expiration_time = datetime.utcnow() + timedelta(minutes=5)
-    await store_verification_code(email, hashed_code, expiration_time, user_id)
-    background_tasks.add_task(send_verification_email, email, verification_code)
+    await store.store(email, hashed_code, expiration_time, user_id)
+    await enqueue_email("verification", email, {"code": verification_code})
+
+async def send_bulk_verifications(user_id: str, emails: list) -> int:
+    """
+    Sends a code to imported emails, at most BULK_VERIFICATION_RATE per
+    user across imports, so an import can't be used to mail arbitrary
+    addresses in bulk. Emails past the cap, or already sent a code in the
+    last minute, are skipped; they can still ask for a resend. Returns how
+    many codes were queued.
+    """
+    limiter = get_rate_limiter()
+    times, seconds = parse_rate(config["BULK_VERIFICATION_RATE"])
+    semaphore = asyncio.Semaphore(config["BULK_VERIFICATION_CONCURRENCY"])
+    sent = 0
+    capped = False
+
+    async def send(email):
+        nonlocal sent, capped
+        async with semaphore:
+            if capped:
+                return
+            try:
+                if limiter is not None and await limiter.hit(f"bulk_verification:{user_id}", times, seconds):
+                    capped = True
+                    return
+            except RedisError as e:
+                logger.error("Bulk verification cap unavailable, not sending: %s", e)
+                capped = True
+                return
+            try:
+                await send_and_store_verification(email, user_id)
+                sent += 1
+            except HTTPException:
+                pass
+    await asyncio.gather(*(send(email) for email in emails))
+    return sent
 
 async def register_user(
     email: str,
     password: str,
-    advertising_id: Optional[str],
-    background_tasks: BackgroundTasks
+    advertising_id: Optional[str]
 ):
     existing_user = await get_user(email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash(password)
     new_user = {
         "email": email,
         "hashed_password": hashed_password,
@@ -75,34 +118,39 @@ async def register_user(
     await add_email(str(user_id), email)
     if advertising_id and advertising_id != "00000000-0000-0000-0000-000000000000":
         await add_device(str(user_id), advertising_id)
-    await send_and_store_verification(email, str(user_id), background_tasks)
+    await send_and_store_verification(email, str(user_id))
     
-    logger.info(f"New user registered: {email}")
+    logger.info("New user registered: %s", email)
     return {"message": "User created successfully. Please check your email for the verification code.", "user_id": str(user_id)}
 
 async def verify_email(email: EmailStr, code: str):
-    verification = await get_verification_code(email)
+    store = get_verification_store()
+    verification = await store.get(email)
     if not verification:
         raise HTTPException(status_code=400, detail="Invalid verification code")
     
-    if not verify_password(code, verification["hashed_code"]):
+    if not await verify_code(code, verification["hashed_code"]):
         raise HTTPException(status_code=400, detail="Invalid verification code")
     
     if verification["expiration_time"] < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Verification code has expired")
     
     await verify_email_db(str(verification["user_id"]), email)
-    await delete_verification_code(email)
-    logger.info(f"Email verified: {email}")
+    await store.delete(email)
+    logger.info("Email verified: %s", email)
     return {"message": "Email verified successfully"}
 
-async def resend_verification(email: EmailStr, background_tasks: BackgroundTasks):
+async def resend_verification(email: EmailStr):
     user = await get_user(email)
     if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+        # Also covers emails added to an account rather than registered with
+        user = await get_unverified_email(email)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = {"_id": user["user_id"]}
     
-    await send_and_store_verification(email, str(user["_id"]), background_tasks)
-    logger.info(f"Verification email resent: {email}")
+    await send_and_store_verification(email, str(user["_id"]))
+    logger.info("Verification email resent: %s", email)
     return {"message": "Verification email sent"}
 
 async def login_user(email: str, password: str):
@@ -110,7 +158,7 @@ async def login_user(email: str, password: str):
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password(password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
     if not user.get("is_verified", False):
@@ -120,54 +168,58 @@ async def login_user(email: str, password: str):
     access_token = create_access_token(
         data={"sub": str(user["_id"])}, expires_delta=access_token_expires
     )
-    logger.info(f"User logged in: {email}")
+    logger.info("User logged in: %s", email, extra={"sample": "login"})
     return {"access_token": access_token, "token_type": "bearer"}
 
 async def update_user_data(user_id: str, user_update: UserUpdate):
     update_data = user_update.model_dump(exclude_unset=True)
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        update_data["hashed_password"] = await get_password_hash(update_data.pop("password"))
     await update_user(user_id, update_data)
-    logger.info(f"User data updated: {user_id}")
+    logger.info("User data updated: %s", user_id)
     return {"message": "User data updated successfully"}
 
-async def add_email_to_user(user_id: str, email_add: EmailAdd, background_tasks: BackgroundTasks):
-    await add_email(user_id, email_add.email)
-    await send_and_store_verification(email_add.email, user_id, background_tasks)
-    logger.info(f"Email added for user: {user_id}")
+async def add_email_to_user(user_id: str, email_add: EmailAdd):
+    try:
+        await add_email(user_id, email_add.email)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already added")
+    await send_and_store_verification(email_add.email, user_id)
+    logger.info("Email added for user: %s", user_id)
     return {"message": "Email added successfully. Please check your email for the verification code."}
 
 async def add_advertising_id_to_user(user_id: str, ad_id_add: AdvertisingIdAdd):
     await add_device(user_id, ad_id_add.advertising_id)
-    logger.info(f"Advertising ID added for user: {user_id}")
+    logger.info("Advertising ID added for user: %s", user_id)
     return {"message": "Advertising ID added successfully"}
 
-async def forgot_password(email: EmailStr, background_tasks: BackgroundTasks):
+async def forgot_password(email: EmailStr):
     user = await get_user(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     reset_code = generate_verification_code()
-    hashed_reset_code = get_password_hash(reset_code)
+    hashed_reset_code = await hash_code(reset_code)
     expiration_time = datetime.utcnow() + timedelta(minutes=15)
-    await store_verification_code(email, hashed_reset_code, expiration_time, str(user["_id"]))
-    background_tasks.add_task(send_password_reset_email, email, reset_code)
-    logger.info(f"Password reset requested for: {email}")
+    await get_verification_store().store(email, hashed_reset_code, expiration_time, str(user["_id"]))
+    await enqueue_email("password_reset", email, {"code": reset_code})
+    logger.info("Password reset requested for: %s", email)
     return {"message": "Password reset email sent"}
 
 async def reset_password(email: EmailStr, reset_code: str, new_password: str):
-    verification = await get_verification_code(email)
+    store = get_verification_store()
+    verification = await store.get(email)
     if not verification:
         raise HTTPException(status_code=400, detail="Invalid reset code")
     
-    if not verify_password(reset_code, verification["hashed_code"]):
+    if not await verify_code(reset_code, verification["hashed_code"]):
         raise HTTPException(status_code=400, detail="Invalid reset code")
     
     if verification["expiration_time"] < datetime.utcnow():
         raise HTTPException(status_code=400, detail="Reset code has expired")
     
-    hashed_password = get_password_hash(new_password)
+    hashed_password = await get_password_hash(new_password)
     await update_user(str(verification["user_id"]), {"hashed_password": hashed_password})
-    await delete_verification_code(email)
-    logger.info(f"Password reset successful for: {email}")
+    await store.delete(email)
+    logger.info("Password reset successful for: %s", email)
     return {"message": "Password reset successfully"}
\ No newline at end of file
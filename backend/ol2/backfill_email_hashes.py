@@ -0,0 +1,50 @@
+"""
+Adds the hashed-email fields to email records written before they existed,
+then rebuilds the hash prefix buckets used by range queries. Safe to re-run;
+the backfill only touches records still missing a hash.
+
+    python backfill_email_hashes.py [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+import database
+from email_hashes import email_hashes
+from hash_ranges import rebuild_hash_prefix_buckets
+from logger import logger
+
+async def backfill(batch_size: int):
+    query = {"$or": [{"email_sha256": {"$exists": False}}, {"email_md5": {"$exists": False}}]}
+    cursor = database.email_collection.find(query, {"email": 1}).batch_size(batch_size)
+    updated = 0
+    operations = []
+    async for record in cursor:
+        operations.append(UpdateOne({"_id": record["_id"]}, {"$set": email_hashes(record["email"])}))
+        if len(operations) >= batch_size:
+            updated += (await database.email_collection.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+            logger.info(f"Backfilled hashes for {updated} emails")
+    if operations:
+        updated += (await database.email_collection.bulk_write(operations, ordered=False)).modified_count
+    logger.info(f"Email hash backfill finished: {updated} emails updated")
+    return updated
+
+async def main(batch_size: int):
+    await database.startup_db_client()
+    try:
+        await backfill(batch_size)
+        await rebuild_hash_prefix_buckets(batch_size)
+    finally:
+        await database.shutdown_db_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
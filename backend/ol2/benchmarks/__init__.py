@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the shared backend/common package importable when running from ol2
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
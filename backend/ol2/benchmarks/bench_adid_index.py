@@ -0,0 +1,82 @@
+"""
+Builds the advertising ID membership index from random IDs and reports its
+memory footprint and lookup throughput.
+
+    python -m benchmarks.bench_adid_index [--size 10000000] [--lookups 200000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from adid_index import AdvertisingIdIndex
+
+
+def random_keys(size):
+    blob = os.urandom(16 * size)
+    return [blob[i:i + 16] for i in range(0, len(blob), 16)]
+
+
+def to_string(key):
+    return str(uuid.UUID(bytes=key))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    keys = random_keys(args.size)
+    probe_hits = [to_string(key) for key in random.sample(keys, min(args.lookups // 2, args.size))]
+    probe_misses = [to_string(key) for key in random_keys(args.lookups // 2)]
+    probes = probe_hits + probe_misses
+    random.shuffle(probes)
+
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = AdvertisingIdIndex()
+    index.load_keys(keys)
+    build_seconds = time.perf_counter() - started
+    del keys
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    hits = sum(index.contains(ad_id) for ad_id in probes)
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for start in range(0, len(probes), args.batch):
+        index.contains_many(probes[start:start + args.batch])
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for ad_id in probe_misses[:10000]:
+        index.add(ad_id)
+    add_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "size": args.size,
+        "build_seconds": round(build_seconds, 2),
+        "index_bytes": retained,
+        "bytes_per_id": round(retained / args.size, 1),
+        "build_peak_bytes": peak,
+        "lookups": len(probes),
+        "hits": hits,
+        "single_lookup_us": round(single_seconds / len(probes) * 1e6, 2),
+        "single_lookups_per_sec": round(len(probes) / single_seconds),
+        "batch_size": args.batch,
+        "batch_lookup_us_per_id": round(batch_seconds / len(probes) * 1e6, 2),
+        "incremental_add_us": round(add_seconds / 10000 * 1e6, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Mixed-traffic load test of the ol2 API, run in process over ASGI against
+mongomock, fakeredis and an aiosmtpd sink.
+
+    python -m benchmarks.bench_load [--duration 30] [--concurrency 32]
+        [--mix register=1,login=2,user_data=10,add_advertising_id=4]
+        [--output results.json] [--compare baseline.json]
+
+Each virtual user repeatedly picks an action by weight. A register action
+registers a new account, waits for the verification email to arrive at the
+sink (sent by in-process outbox workers) and posts the code to
+/verify-email; the other actions use pre-seeded verified accounts.
+
+Results are one JSON document: requests per second and latency percentiles
+per endpoint, and process CPU time per request (bcrypt executor, outbox
+workers and the sink thread included). --compare reads an earlier result
+and adds the relative change of each endpoint's rps and p95.
+"""
+import os
+
+# Poll the outbox quickly so verify-email isn't gated on a 1s poll interval
+os.environ.setdefault("OUTBOX_POLL_INTERVAL", "0.05")
+
+from benchmarks.fakes import install_fake_database, install_fake_redis, install_smtp_sink, percentiles, check_not_throttled
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+import re
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta
+import httpx
+import hashing
+import outbox_worker
+from main import app
+from utils import create_access_token
+
+PASSWORD = "BenchPassw0rd!"
+DEFAULT_MIX = "register=1,login=2,user_data=10,add_advertising_id=4"
+CODE_PATTERN = re.compile(r"verification code is: (\d{6})")
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        action, _, weight = item.partition("=")
+        mix[action.strip()] = float(weight)
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, name, elapsed, status):
+        self.samples.setdefault(name, []).append(elapsed)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+    async def request(self, client, name, method, path, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        self.record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+
+async def seed(db, count):
+    hashed_password = hashing._hash(PASSWORD)
+    now = datetime.utcnow()
+    accounts = []
+    for i in range(count):
+        email = f"seed-{i}@example.com"
+        result = await db.users.insert_one({
+            "email": email,
+            "hashed_password": hashed_password,
+            "is_verified": True,
+            "created_at": now,
+            "updated_at": now,
+        })
+        await db.emails.insert_one({
+            "user_id": result.inserted_id, "email": email, "is_verified": True,
+            "status": "created", "created_at": now, "updated_at": now,
+        })
+        token = create_access_token({"sub": str(result.inserted_id)}, timedelta(hours=1))
+        accounts.append((email, {"Authorization": f"Bearer {token}"}))
+    return accounts
+
+
+async def register_and_verify(client, recorder, sink, email, ip):
+    response = await recorder.request(
+        client, "register", "POST", "/register", json={"email": email, "password": PASSWORD},
+        headers={"X-Forwarded-For": ip},
+    )
+    if response.status_code != 200:
+        return
+    started = time.perf_counter()
+    try:
+        body = await sink.receive(email)
+    except asyncio.TimeoutError:
+        recorder.record("email_delivery", time.perf_counter() - started, "timeout")
+        return
+    recorder.record("email_delivery", time.perf_counter() - started, 250)
+    code = CODE_PATTERN.search(body).group(1)
+    await recorder.request(
+        client, "verify_email", "POST", "/verify-email", json={"email": email, "code": code},
+        headers={"X-Forwarded-For": ip},
+    )
+
+
+async def virtual_user(client, recorder, sink, accounts, mix, stop, counter):
+    actions, weights = zip(*mix.items())
+    while not stop.is_set():
+        n = next(counter)
+        # A fresh client address per action keeps the per-IP login limit out of the way
+        ip = f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"
+        action = random.choices(actions, weights)[0]
+        email, headers = random.choice(accounts)
+        headers = {**headers, "X-Forwarded-For": ip}
+        if action == "register":
+            await register_and_verify(client, recorder, sink, f"load-{uuid.uuid4().hex[:12]}@example.com", ip)
+        elif action == "login":
+            await recorder.request(
+                client, "login", "POST", "/login", json={"email": email, "password": PASSWORD},
+                headers={"X-Forwarded-For": ip},
+            )
+        elif action == "user_data":
+            await recorder.request(client, "user_data", "GET", "/user-data", headers=headers)
+        elif action == "add_advertising_id":
+            await recorder.request(
+                client, "add_advertising_id", "POST", "/add-advertising-id",
+                json={"advertising_id": str(uuid.uuid4())}, headers=headers,
+            )
+        else:
+            raise ValueError(f"Unknown action {action!r}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline):
+    changes = {}
+    for name, current in result["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous.get("rps") or not previous.get("p95_ms"):
+            continue
+        changes[name] = {
+            "rps_change": round(current["rps"] / previous["rps"] - 1, 3),
+            "p95_change": round(current["p95_ms"] / previous["p95_ms"] - 1, 3),
+        }
+    return {"baseline_commit": baseline.get("commit"), "endpoints": changes}
+
+
+async def run(args):
+    mix = parse_mix(args.mix)
+    db = install_fake_database()
+    await install_fake_redis()
+    sink, controller = install_smtp_sink()
+    accounts = await seed(db, args.users)
+    recorder = Recorder()
+    stop, stop_workers = asyncio.Event(), asyncio.Event()
+    # Workers outlive the virtual users so in-flight registrations still get their email
+    workers = asyncio.create_task(outbox_worker.run_workers(args.outbox_workers, stop_workers))
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            counter = itertools.count()
+            cpu_started, started = time.process_time(), time.perf_counter()
+            users = [
+                asyncio.create_task(virtual_user(client, recorder, sink, accounts, mix, stop, counter))
+                for _ in range(args.concurrency)
+            ]
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*users)
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    finally:
+        stop.set()
+        stop_workers.set()
+        await workers
+        controller.stop()
+
+    endpoints = {}
+    for name, statuses in recorder.statuses.items():
+        check_not_throttled(name, statuses)
+    for name, samples in sorted(recorder.samples.items()):
+        endpoints[name] = {
+            **percentiles(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "statuses": {str(status): count for status, count in recorder.statuses[name].items()},
+        }
+    total = sum(len(samples) for name, samples in recorder.samples.items() if name != "email_delivery")
+    return {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "duration_s": round(elapsed, 2),
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "seeded_users": args.users,
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "cpu_ms_per_request": round(cpu * 1000 / total, 3) if total else None,
+        "emails_received": sink.received,
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--users", type=int, default=200, help="verified accounts to seed")
+    parser.add_argument("--outbox-workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the action sequence")
+    parser.add_argument("--output", help="also write the result to this file")
+    parser.add_argument("--compare", help="earlier result to compare against")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    result = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(result, json.load(f))
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures /health and /user-data latency while /login is under heavy load.
+
+    python -m benchmarks.bench_login_load [--inline-bcrypt] [--duration 10]
+
+--inline-bcrypt runs bcrypt on the event loop, as ol2 did before hashing was
+moved to an executor, to give a before/after comparison.
+"""
+from benchmarks.fakes import install_fake_database, install_fake_redis, percentiles, check_not_throttled
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from datetime import datetime, timedelta
+import httpx
+import hashing
+from main import app
+from utils import create_access_token
+
+EMAIL = "bench@example.com"
+PASSWORD = "Bench-passw0rd!"
+
+
+def use_inline_bcrypt():
+    async def hash_password(password):
+        return hashing._hash(password)
+
+    async def verify_password(plain_password, hashed_password):
+        return hashing._verify(plain_password, hashed_password)
+
+    hashing.hash_password = hash_password
+    hashing.verify_password = verify_password
+
+
+async def seed(db):
+    now = datetime.utcnow()
+    result = await db.users.insert_one({
+        "email": EMAIL,
+        "hashed_password": hashing._hash(PASSWORD),
+        "is_verified": True,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return create_access_token({"sub": str(result.inserted_id)}, timedelta(hours=1))
+
+
+async def login_flood(client, stop, counter, ips):
+    while not stop.is_set():
+        response = await client.post(
+            "/login",
+            json={"email": EMAIL, "password": PASSWORD},
+            headers={"X-Forwarded-For": next(ips)},
+        )
+        counter[response.status_code] = counter.get(response.status_code, 0) + 1
+
+
+async def probe(client, path, stop, samples, headers=None):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.005)
+
+
+async def run(args):
+    db = install_fake_database()
+    await install_fake_redis()
+    token = await seed(db)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        logins = {}
+        health, user_data = [], []
+        ips = (f"10.0.{i // 256 % 256}.{i % 256}" for i in itertools.count())
+        tasks = [asyncio.create_task(login_flood(client, stop, logins, ips)) for _ in range(args.login_concurrency)]
+        tasks.append(asyncio.create_task(probe(client, "/health", stop, health)))
+        tasks.append(asyncio.create_task(
+            probe(client, "/user-data", stop, user_data, {"Authorization": f"Bearer {token}"})
+        ))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    check_not_throttled("/login", logins)
+    return {
+        "mode": "inline" if args.inline_bcrypt else "executor",
+        "duration_s": args.duration,
+        "login_concurrency": args.login_concurrency,
+        "login_responses": logins,
+        "login_rps": round(sum(logins.values()) / args.duration, 1),
+        "health": percentiles(health),
+        "user_data": percentiles(user_data),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    parser.add_argument("--inline-bcrypt", action="store_true")
+    args = parser.parse_args()
+    if args.inline_bcrypt:
+        use_inline_bcrypt()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures what the Prometheus instrumentation costs per request: a bare
+FastAPI route called directly over ASGI with and without MetricsMiddleware,
+plus the raw cost of one histogram observation.
+
+    python -m benchmarks.bench_metrics [--requests 20000]
+"""
+import argparse
+import asyncio
+import json
+import time
+from common.metrics import MetricsMiddleware, Histogram, Registry
+from benchmarks.bench_middleware import base_app, measure
+
+
+def instrumented_app():
+    app = base_app()
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def time_observe(count):
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ("route",), registry=Registry())
+    started = time.perf_counter()
+    for i in range(count):
+        histogram.observe(0.003, "/ping")
+    return (time.perf_counter() - started) / count
+
+
+async def run(args):
+    results = {"requests": args.requests}
+    # Interleave runs so drift in machine load hits both sides equally
+    plain, instrumented = [], []
+    for _ in range(args.rounds):
+        plain.append(await measure(base_app(), args.requests, 1))
+        instrumented.append(await measure(instrumented_app(), args.requests, 1))
+    plain_rps, instrumented_rps = max(plain), max(instrumented)
+    results["plain_rps"] = round(plain_rps)
+    results["instrumented_rps"] = round(instrumented_rps)
+    results["overhead_us_per_request"] = round((1 / instrumented_rps - 1 / plain_rps) * 1e6, 2)
+    results["histogram_observe_us"] = round(time_observe(args.requests * 10) * 1e6, 3)
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
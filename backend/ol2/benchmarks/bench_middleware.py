@@ -0,0 +1,112 @@
+"""
+Compares requests per second through the old BaseHTTPMiddleware stack
+(secure headers plus the no-op log_requests hook) and the pure ASGI
+SecurityHeadersMiddleware, calling the ASGI app directly so transport
+overhead doesn't mask the difference.
+
+    python -m benchmarks.bench_middleware [--requests 20000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+import secure
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from common.security_headers import SecurityHeadersMiddleware
+from middleware import SECURE_HEADERS
+
+secure_headers = secure.Secure.with_default_headers()
+
+
+def base_app():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def before_app():
+    # The stack ol2 ran before: secure headers and log_requests as BaseHTTPMiddleware
+    app = base_app()
+
+    class SecureHeadersMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            response = await call_next(request)
+            await secure_headers.set_headers_async(response)
+            return response
+
+    app.add_middleware(SecureHeadersMiddleware)
+
+    @app.middleware("http")
+    async def log_requests(request, call_next):
+        return await call_next(request)
+
+    return app
+
+
+def after_app():
+    app = base_app()
+    app.add_middleware(SecurityHeadersMiddleware, headers=SECURE_HEADERS)
+    return app
+
+
+SCOPE = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+    "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+    "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+}
+
+
+async def call(app):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(SCOPE), receive, send)
+    return status
+
+
+async def measure(app, requests, concurrency):
+    assert await call(app) == 200
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await call(app)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args):
+    results = {"requests": args.requests, "concurrency": args.concurrency}
+    for name, factory in (("no_middleware", base_app), ("before", before_app), ("after", after_app)):
+        app = factory()
+        await measure(app, args.requests // 10, args.concurrency)  # warm up
+        results[f"{name}_rps"] = round(await measure(app, args.requests, args.concurrency))
+    results["speedup"] = round(results["after_rps"] / results["before_rps"], 2)
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
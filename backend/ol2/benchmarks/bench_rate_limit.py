@@ -0,0 +1,94 @@
+"""
+Measures the per-request cost of the shared rate limiter: direct checks on a
+tight limit (one EVALSHA each), on a generous limit (mostly served from the
+local token lease), and end to end through a FastAPI route with and without
+the dependency.
+
+    python -m benchmarks.bench_rate_limit [--requests 20000] [--redis-url redis://localhost]
+
+Without --redis-url an in-process fakeredis is used, which runs the Lua
+script in lupa and is slower than a real Redis round trip on localhost.
+"""
+import argparse
+import asyncio
+import json
+import time
+import fakeredis.aioredis
+import httpx
+import redis.asyncio as redis
+from fastapi import Depends, FastAPI
+from common.rate_limit import RateLimit, init_rate_limiter
+
+
+async def time_hits(limiter, requests, times, seconds, clients):
+    started = time.perf_counter()
+    denied = 0
+    for i in range(requests):
+        if await limiter.hit(f"bench:{i % clients}", times, seconds):
+            denied += 1
+    return (time.perf_counter() - started) / requests, denied
+
+
+def build_app(limited):
+    app = FastAPI()
+    dependencies = [Depends(RateLimit("1000000/minute"))] if limited else []
+
+    @app.get("/ping", dependencies=dependencies)
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def time_requests(app, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/ping")
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/ping")
+        return (time.perf_counter() - started) / requests
+
+
+async def run(args):
+    if args.redis_url:
+        redis_client = redis.from_url(args.redis_url, encoding="utf-8", decode_responses=True)
+    else:
+        redis_client = fakeredis.aioredis.FakeRedis(encoding="utf-8", decode_responses=True)
+    await redis_client.flushall()
+    results = {"redis": args.redis_url or "fakeredis", "requests": args.requests}
+
+    limiter = init_rate_limiter(redis_client)
+    per_check, denied = await time_hits(limiter, args.requests, 5, 60, args.requests)
+    results["tight_limit_us_per_check"] = round(per_check * 1e6, 1)
+    results["tight_limit_redis_calls"] = limiter.redis_calls
+
+    limiter = init_rate_limiter(redis_client)
+    per_check, denied = await time_hits(limiter, args.requests, 100000, 60, 10)
+    results["leased_limit_us_per_check"] = round(per_check * 1e6, 1)
+    results["leased_limit_redis_calls"] = limiter.redis_calls
+    results["leased_limit_local_hits"] = limiter.local_hits
+    results["leased_limit_denied"] = denied
+
+    limiter = init_rate_limiter(redis_client, lease_fraction=0)
+    per_check, _ = await time_hits(limiter, args.requests, 100000, 60, 10)
+    results["unleased_limit_us_per_check"] = round(per_check * 1e6, 1)
+
+    baseline = await time_requests(build_app(False), args.requests // 10)
+    init_rate_limiter(redis_client)
+    limited = await time_requests(build_app(True), args.requests // 10)
+    results["asgi_baseline_us"] = round(baseline * 1e6, 1)
+    results["asgi_limited_us"] = round(limited * 1e6, 1)
+    results["asgi_overhead_us"] = round((limited - baseline) * 1e6, 1)
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--redis-url")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
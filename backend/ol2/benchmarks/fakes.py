@@ -0,0 +1,142 @@
+"""
+In-process stand-ins for the services ol2 talks to, so the app can be driven
+over ASGI without a MongoDB, Redis or SMTP server (SMTP goes to a local
+aiosmtpd sink).
+
+Run benchmarks from the ol2 directory, e.g. `python -m benchmarks.bench_login_load`.
+"""
+import os
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("CODE_HASH_SECRET", "benchmark-secret")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("EMAIL_FROM", "bench@example.com")
+
+import asyncio
+import smtplib
+import socket
+import statistics
+import threading
+from email import message_from_bytes
+from aiosmtpd.controller import Controller
+from mongomock_motor import AsyncMongoMockClient
+import fakeredis.aioredis
+from common.rate_limit import init_rate_limiter
+from smtp_pool import SMTPConnectionPool
+import database
+import utils
+
+
+def install_fake_database():
+    client = AsyncMongoMockClient()
+    db = client.users_db
+    database.client = client
+    database.database = db
+    database.user_collection = db.get_collection("users")
+    database.email_collection = db.get_collection("emails")
+    database.device_collection = db.get_collection("devices")
+    database.verification_collection = db.get_collection("verification_codes")
+    database.outbox_collection = db.get_collection("email_outbox")
+    database.hash_prefix_collection = db.get_collection("email_hash_prefixes")
+    return db
+
+
+async def install_fake_redis():
+    redis_client = fakeredis.aioredis.FakeRedis(encoding="utf-8", decode_responses=True)
+    # httpx.ASGITransport connects from 127.0.0.1; trusting it lets the
+    # benchmarks spread load over many X-Forwarded-For client addresses
+    init_rate_limiter(redis_client, trusted_proxies="127.0.0.1")
+    return redis_client
+
+
+def check_not_throttled(name, statuses: dict, max_throttled_share: float = 0.1):
+    """
+    Raises if too many of an endpoint's responses were 429s, which means
+    the run measured the rate limiter instead of the endpoint.
+    """
+    total = sum(statuses.values())
+    throttled = statuses.get(429, 0) + statuses.get("429", 0)
+    if total and throttled / total > max_throttled_share:
+        raise RuntimeError(f"{name}: {throttled} of {total} responses were 429s; the benchmark is hitting the rate limiter")
+
+
+class SMTPSink:
+    """
+    aiosmtpd handler that accepts every message. Messages are kept by
+    recipient until a coroutine collects them with receive().
+    """
+
+    def __init__(self):
+        self.received = 0
+        self._inbox = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        body = message_from_bytes(envelope.original_content or envelope.content)
+        text = "".join(part.get_payload(decode=True).decode() for part in body.walk() if not part.is_multipart())
+        for recipient in envelope.rcpt_tos:
+            self._deliver(recipient, text)
+        return "250 Message accepted for delivery"
+
+    def _deliver(self, recipient, text):
+        # Runs on the controller's thread; waiters live on the benchmark's loop
+        with self._lock:
+            self.received += 1
+            waiter = self._waiters.pop(recipient, None)
+            if waiter is None:
+                self._inbox[recipient] = text
+        if waiter is not None:
+            future, loop = waiter
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(text))
+
+    async def receive(self, recipient: str, timeout: float = 30.0) -> str:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if recipient in self._inbox:
+                return self._inbox.pop(recipient)
+            future = loop.create_future()
+            self._waiters[recipient] = (future, loop)
+        return await asyncio.wait_for(future, timeout)
+
+
+class _PlainSMTPConnectionPool(SMTPConnectionPool):
+    # The sink speaks plain SMTP, so skip STARTTLS and login
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return server
+
+
+def install_smtp_sink(pool_size: int = 4):
+    """
+    Starts an aiosmtpd sink on a free local port and points utils.smtp_pool
+    at it. Returns (sink, controller); call controller.stop() when done.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    sink = SMTPSink()
+    controller = Controller(sink, hostname="127.0.0.1", port=port)
+    controller.start()
+    utils.smtp_pool = _PlainSMTPConnectionPool("127.0.0.1", port, None, None, max_size=pool_size)
+    return sink, controller
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import math
+import os
+import struct
+from email_hashes import normalize_email
+
+# Snapshot layout (all integers big-endian):
+#   magic "PMDBLOOM" | format u8 | kind u8 (0 full, 1 delta) | hash count u16
+#   | bit count u64 | item count u64 | version u64 | base version u64 | bit array
+# Items are 16-byte packed advertising IDs and 32-byte SHA-256 digests of
+# normalized (trimmed, lower-cased) emails. Bit positions are derived by
+# double hashing: blake2b(item, 16 bytes) -> h1, h2; bit_i = (h1 + i * h2) mod bits.
+MAGIC = b"PMDBLOOM"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">8sBBHQQQQ")
+KIND_FULL = 0
+KIND_DELTA = 1
+MANIFEST = "manifest.json"
+
+
+def email_key(email: str) -> bytes:
+    return hashlib.sha256(normalize_email(email).encode()).digest()
+
+
+def read_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"full": None, "delta": None}
+
+
+class BloomFilter:
+    """
+    Plain Bloom filter over a bytearray, sized for an expected item count and
+    target false-positive rate.
+    """
+
+    def __init__(self, bits: int, hashes: int):
+        self.bits = max(bits, 8)
+        self.hashes = hashes
+        self.count = 0
+        self.array = bytearray((self.bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, items: int, false_positive_rate: float):
+        items = max(items, 1)
+        bits = math.ceil(-items * math.log(false_positive_rate) / (math.log(2) ** 2))
+        hashes = max(1, round(bits / items * math.log(2)))
+        return cls(bits, hashes)
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        bits = self.bits
+        return [(h1 + i * h2) % bits for i in range(self.hashes)]
+
+    def add(self, item: bytes):
+        array = self.array
+        for position in self._positions(item):
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: bytes) -> bool:
+        array = self.array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_bytes(self, kind: int, version: int, base_version: int = 0) -> bytes:
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, kind, self.hashes, self.bits, self.count, version, base_version)
+        return header + bytes(self.array)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        magic, fmt, kind, hashes, bits, count, version, base_version = HEADER.unpack_from(data)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError("Not a protect-my-data Bloom filter snapshot")
+        bloom = cls(bits, hashes)
+        bloom.count = count
+        bloom.array = bytearray(data[HEADER.size:])
+        return bloom, {"kind": kind, "version": version, "base_version": base_version}
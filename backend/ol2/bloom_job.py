@@ -0,0 +1,157 @@
+"""
+Builds Bloom filter snapshots of opted-out identifiers for partners that
+check bids locally. Run it as its own process next to the API:
+
+    python bloom_job.py           # full rebuild on start, then on a schedule
+    python bloom_job.py --once    # one full rebuild and exit
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from bloom import BloomFilter, email_key, read_manifest, KIND_FULL, KIND_DELTA, MANIFEST
+from adid_index import pack_advertising_id
+import database
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+def snapshot_dir():
+    path = config["BLOOM_SNAPSHOT_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _version(built_at: datetime) -> int:
+    return (built_at - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _publish(manifest: dict, kind: str, bloom: BloomFilter, version: int, base_version: int, built_at: datetime):
+    name = f"{kind}-{version}.bloom" if kind == "full" else f"delta-{base_version}-{version}.bloom"
+    data = bloom.to_bytes(KIND_FULL if kind == "full" else KIND_DELTA, version, base_version)
+    directory = snapshot_dir()
+    _write_atomic(os.path.join(directory, name), data)
+    manifest[kind] = {
+        "file": name,
+        "version": version,
+        "base_version": base_version,
+        "etag": f'"{kind}-{version}"',
+        "items": bloom.count,
+        "bits": bloom.bits,
+        "hashes": bloom.hashes,
+        "bytes": len(data),
+        "built_at": built_at.isoformat(),
+    }
+    _write_atomic(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2).encode())
+    _prune(manifest)
+    logger.info(f"Published {kind} Bloom snapshot {name}: {bloom.count} items, {len(data)} bytes")
+
+def _prune(manifest: dict):
+    # Keep the files the manifest points at plus the previous full, for partners mid-download
+    directory = snapshot_dir()
+    keep = {entry["file"] for entry in manifest.values() if entry}
+    fulls = sorted((name for name in os.listdir(directory) if name.startswith("full-")), reverse=True)
+    keep.update(fulls[:2])
+    for name in os.listdir(directory):
+        if name.endswith(".bloom") and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+async def _fill(bloom: BloomFilter, device_query: dict, email_query: dict):
+    batch_size = config["EXPORT_BATCH_SIZE"]
+    devices = database.device_collection.find(device_query, {"advertising_id": 1, "_id": 0}).batch_size(batch_size)
+    async for device in devices:
+        key = pack_advertising_id(device.get("advertising_id"))
+        if key is not None:
+            bloom.add(key)
+    emails = database.email_collection.find(email_query, {"email": 1, "_id": 0}).batch_size(batch_size)
+    async for email in emails:
+        bloom.add(email_key(email["email"]))
+
+def _queries(since: datetime | None):
+    device_query = {"status": "active"}
+    email_query = {"status": "active", "is_verified": True}
+    if since:
+        device_query["updated_at"] = {"$gte": since}
+        email_query["updated_at"] = {"$gte": since}
+    return device_query, email_query
+
+async def _build(since: datetime | None):
+    device_query, email_query = _queries(since)
+    expected = (
+        await database.device_collection.count_documents(device_query)
+        + await database.email_collection.count_documents(email_query)
+    )
+    bloom = BloomFilter.for_capacity(expected, config["BLOOM_FALSE_POSITIVE_RATE"])
+    await _fill(bloom, device_query, email_query)
+    return bloom
+
+# Full and delta builds both rewrite the manifest; one at a time, or a delta
+# started before a full rebuild would publish the superseded full entry back
+_build_lock = asyncio.Lock()
+
+async def _build_full():
+    built_at = datetime.utcnow()
+    version = _version(built_at)
+    bloom = await _build(None)
+    manifest = read_manifest(snapshot_dir())
+    manifest["delta"] = None
+    _publish(manifest, "full", bloom, version, 0, built_at)
+
+async def build_full():
+    async with _build_lock:
+        await _build_full()
+
+async def build_delta():
+    """
+    Publishes a filter of everything opted out since the current full
+    snapshot. Deltas are cumulative, so a partner only needs the full
+    snapshot plus the latest delta. Bloom filters can't express removals;
+    those take effect at the next full rebuild.
+    """
+    async with _build_lock:
+        manifest = read_manifest(snapshot_dir())
+        if not manifest.get("full"):
+            await _build_full()
+            return
+        base_version = manifest["full"]["version"]
+        since = datetime.fromisoformat(manifest["full"]["built_at"])
+        built_at = datetime.utcnow()
+        bloom = await _build(since)
+        # Another process may share the snapshot directory; re-read so its full isn't overwritten
+        manifest = read_manifest(snapshot_dir())
+        if (manifest.get("full") or {}).get("version") != base_version:
+            logger.info(f"Full Bloom snapshot changed during the delta build; dropping delta against {base_version}")
+            return
+        _publish(manifest, "delta", bloom, _version(built_at), base_version, built_at)
+
+async def run_scheduler():
+    await database.startup_db_client()
+    await build_full()
+    scheduler = AsyncIOScheduler(timezone="UTC")
+    scheduler.add_job(build_full, trigger="interval", hours=config["BLOOM_FULL_INTERVAL_HOURS"], max_instances=1)
+    scheduler.add_job(build_delta, trigger="interval", minutes=config["BLOOM_DELTA_INTERVAL_MINUTES"], max_instances=1)
+    scheduler.start()
+    await asyncio.Event().wait()
+
+async def run_once():
+    await database.startup_db_client()
+    await build_full()
+    await database.shutdown_db_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run_once() if args.once else run_scheduler())
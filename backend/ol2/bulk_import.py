@@ -0,0 +1,181 @@
+import csv
+import json
+from fastapi import HTTPException, Request
+from email_validator import validate_email, EmailNotValidError
+from common.advertising_id import validate_advertising_id, ZERO_ADVERTISING_ID
+from database import add_devices_bulk, add_emails_bulk
+from auth import send_bulk_verifications
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+async def iter_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+async def read_capped(request: Request, max_bytes: int) -> bytes:
+    # Refuses oversized bodies up front when Content-Length is sent, and while reading when it isn't
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"JSON uploads are limited to {max_bytes} bytes; use NDJSON or CSV for larger imports"
+    )
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+def _pick(record, field: str):
+    if isinstance(record, dict):
+        return record.get(field)
+    return record
+
+async def iter_rows(request: Request, field: str):
+    """
+    Yields (row_number, value) pairs from an NDJSON, CSV or JSON array body.
+    NDJSON and CSV are read line by line as the upload streams in; a JSON
+    array has to be read whole, so it is capped at BULK_IMPORT_MAX_JSON_BYTES.
+    Rows that can't be parsed yield a ValueError in place of the value.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_TYPES:
+        row = 0
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                yield row, _pick(json.loads(line), field)
+            except ValueError:
+                yield row, ValueError("Row is not valid JSON")
+    elif content_type == "text/csv":
+        column = None
+        row = 0
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            values = next(csv.reader([line]))
+            if column is None:
+                header = [value.strip().lower() for value in values]
+                if field not in header:
+                    raise HTTPException(status_code=400, detail=f"CSV header must include a '{field}' column")
+                column = header.index(field)
+                continue
+            row += 1
+            yield row, values[column].strip() if column < len(values) else None
+    elif content_type == "application/json":
+        try:
+            records = json.loads(await read_capped(request, config["BULK_IMPORT_MAX_JSON_BYTES"]))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="JSON body must be an array")
+        for row, record in enumerate(records, start=1):
+            yield row, _pick(record, field)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload must be application/x-ndjson, text/csv or application/json"
+        )
+
+def normalize_advertising_id(value):
+    if not validate_advertising_id(value):
+        raise ValueError("Invalid advertising ID format")
+    if value == ZERO_ADVERTISING_ID:
+        raise ValueError("All-zero advertising ID")
+    # Lower-case so duplicates are caught regardless of how the ID was spelled
+    return value.lower()
+
+def normalize_email(value):
+    if not isinstance(value, str):
+        raise ValueError("Missing email")
+    try:
+        return validate_email(value, check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise ValueError(str(e))
+
+async def _import(request: Request, user_id: str, field: str, normalize, insert_chunk):
+    chunk_size = config["BULK_IMPORT_CHUNK_SIZE"]
+    max_rows = config["BULK_IMPORT_MAX_ROWS"]
+    errors = []
+    seen = set()
+    chunk, chunk_rows = [], []
+    total = inserted = existing = 0
+
+    async def flush():
+        nonlocal inserted, existing
+        failed, already_stored = await insert_chunk(user_id, chunk)
+        for index, message in failed.items():
+            errors.append({"row": chunk_rows[index], "error": message})
+        inserted += len(chunk) - len(failed) - len(already_stored)
+        existing += len(already_stored)
+        chunk.clear()
+        chunk_rows.clear()
+
+    async for row, value in iter_rows(request, field):
+        if row > max_rows:
+            errors.append({"row": row, "error": f"Row limit of {max_rows} exceeded, remaining rows ignored"})
+            break
+        total = row
+        try:
+            if isinstance(value, ValueError):
+                raise value
+            if value is None:
+                raise ValueError(f"Missing {field}")
+            value = normalize(value)
+        except ValueError as e:
+            errors.append({"row": row, "error": str(e)})
+            continue
+        if value in seen:
+            errors.append({"row": row, "error": "Duplicate of an earlier row"})
+            continue
+        seen.add(value)
+        chunk.append(value)
+        chunk_rows.append(row)
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+
+    errors.sort(key=lambda error: error["row"])
+    logger.info(f"Bulk import of {field} for user {user_id}: {inserted} of {total} rows inserted, {existing} already stored")
+    return {"total": total, "inserted": inserted, "existing": existing, "failed": len(errors), "errors": errors}
+
+async def import_advertising_ids(request: Request, user_id: str):
+    return await _import(request, user_id, "advertising_id", normalize_advertising_id, add_devices_bulk)
+
+async def import_emails(request: Request, user_id: str, send_verification: bool = False):
+    """
+    Imported emails start unverified. With send_verification, new ones are
+    sent a code, up to the per-user cap (see send_bulk_verifications);
+    otherwise each can be verified later through resend-verification.
+    """
+    sent = 0
+
+    async def insert_chunk(user_id: str, emails: list):
+        nonlocal sent
+        failed, existing = await add_emails_bulk(user_id, emails)
+        if send_verification:
+            sent += await send_bulk_verifications(
+                user_id, [email for index, email in enumerate(emails) if index not in failed and index not in existing]
+            )
+        return failed, existing
+
+    result = await _import(request, user_id, "email", normalize_email, insert_chunk)
+    result["verification_sent"] = sent
+    return result
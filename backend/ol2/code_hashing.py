@@ -0,0 +1,21 @@
+import hashing
+from common.code_hashing import build_code_hashers, identify_hasher
+from config import load_config
+
+config = load_config()
+
+# Raises at import, and so at startup, if CODE_HASH_SCHEME can't be honoured
+_active_hasher, code_hashers = build_code_hashers(config["CODE_HASH_SCHEME"], config["CODE_HASH_SECRET"])
+
+async def hash_code(code: str) -> str:
+    if _active_hasher.blocking:
+        return await hashing.hash_password(code)
+    return _active_hasher.hash(code)
+
+async def verify_code(code: str, hashed_code: str) -> bool:
+    hasher = identify_hasher(code_hashers, hashed_code)
+    if hasher is None:
+        return False
+    if hasher.blocking:
+        return await hashing.verify_password(code, hashed_code)
+    return hasher.verify(code, hashed_code)
@@ -6,13 +6,61 @@ load_dotenv(override=True)
 def load_config():
     return {
         "MONGO_DETAILS": os.getenv("MONGODB_URI"),
+        "MONGO_MAX_POOL_SIZE": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "MONGO_MIN_POOL_SIZE": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "MONGO_WAIT_QUEUE_TIMEOUT_MS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")),  # 0 waits forever
+        "MONGO_SLOW_QUERY_MS": float(os.getenv("MONGO_SLOW_QUERY_MS", "100")),
         "SECRET_KEY": os.getenv("SECRET_KEY"),
         "EMAIL_HOST": os.getenv("EMAIL_HOST", "smtp.gmail.com"),
         "EMAIL_PORT": int(os.getenv("EMAIL_PORT", "587")),
         "EMAIL_USERNAME": os.getenv("EMAIL_USERNAME"),
         "EMAIL_PASSWORD": os.getenv("EMAIL_PASSWORD"),
         "EMAIL_FROM": os.getenv("EMAIL_FROM"),
+        "EMAIL_POOL_SIZE": int(os.getenv("EMAIL_POOL_SIZE", "4")),
+        "EMAIL_POOL_IDLE_TIMEOUT": float(os.getenv("EMAIL_POOL_IDLE_TIMEOUT", "60")),
         "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY"),
         "JWT_ALGORITHM": os.getenv("JWT_ALGORITHM", "HS256"),
         "ACCESS_TOKEN_EXPIRE_MINUTES": int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")),
+        "PASSWORD_HASH_EXECUTOR": os.getenv("PASSWORD_HASH_EXECUTOR", "thread"),
+        "PASSWORD_HASH_WORKERS": int(os.getenv("PASSWORD_HASH_WORKERS", "4")),
+        "CODE_HASH_SCHEME": os.getenv("CODE_HASH_SCHEME", "hmac-sha256"),
+        "CODE_HASH_SECRET": os.getenv("CODE_HASH_SECRET", os.getenv("SECRET_KEY")),
+        # Encrypts email_outbox params (one-time codes) at rest
+        "OUTBOX_PARAMS_SECRET": os.getenv("OUTBOX_PARAMS_SECRET", os.getenv("CODE_HASH_SECRET", os.getenv("SECRET_KEY"))),
+        "OUTBOX_WORKERS": int(os.getenv("OUTBOX_WORKERS", "4")),
+        "OUTBOX_MAX_ATTEMPTS": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6")),
+        "OUTBOX_BACKOFF_SECONDS": float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5")),
+        "OUTBOX_POLL_INTERVAL": float(os.getenv("OUTBOX_POLL_INTERVAL", "1")),
+        "OUTBOX_LOCK_SECONDS": int(os.getenv("OUTBOX_LOCK_SECONDS", "120")),
+        "BULK_IMPORT_CHUNK_SIZE": int(os.getenv("BULK_IMPORT_CHUNK_SIZE", "1000")),
+        "BULK_IMPORT_MAX_ROWS": int(os.getenv("BULK_IMPORT_MAX_ROWS", "1000000")),
+        "BULK_IMPORT_MAX_JSON_BYTES": int(os.getenv("BULK_IMPORT_MAX_JSON_BYTES", str(10 * 1024 * 1024))),  # JSON arrays are read whole
+        "BULK_VERIFICATION_RATE": os.getenv("BULK_VERIFICATION_RATE", "200/day"),  # codes a user can have sent to imported emails
+        "BULK_VERIFICATION_CONCURRENCY": int(os.getenv("BULK_VERIFICATION_CONCURRENCY", "10")),
+        "EXPORT_API_KEY": os.getenv("EXPORT_API_KEY"),
+        "EXPORT_BATCH_SIZE": int(os.getenv("EXPORT_BATCH_SIZE", "5000")),
+        "ADID_INDEX_ENABLED": os.getenv("ADID_INDEX_ENABLED", "true").lower() == "true",
+        "ADID_INDEX_REFRESH_SECONDS": float(os.getenv("ADID_INDEX_REFRESH_SECONDS", "30")),
+        "ADID_LOOKUP_MAX_BATCH": int(os.getenv("ADID_LOOKUP_MAX_BATCH", "10000")),
+        "SUPPRESSION_MATCH_BATCH_SIZE": int(os.getenv("SUPPRESSION_MATCH_BATCH_SIZE", "5000")),
+        "SUPPRESSION_MATCH_CONCURRENCY": int(os.getenv("SUPPRESSION_MATCH_CONCURRENCY", "4")),
+        "HASH_RANGE_CACHE_SECONDS": int(os.getenv("HASH_RANGE_CACHE_SECONDS", "300")),
+        "BLOOM_SNAPSHOT_DIR": os.getenv("BLOOM_SNAPSHOT_DIR", "bloom_snapshots"),
+        "BLOOM_FALSE_POSITIVE_RATE": float(os.getenv("BLOOM_FALSE_POSITIVE_RATE", "0.001")),
+        "BLOOM_FULL_INTERVAL_HOURS": float(os.getenv("BLOOM_FULL_INTERVAL_HOURS", "24")),
+        "BLOOM_DELTA_INTERVAL_MINUTES": float(os.getenv("BLOOM_DELTA_INTERVAL_MINUTES", "15")),
+        "REDIS_URL": os.getenv("REDIS_URL", "redis://localhost"),
+        "RATE_LIMIT_TRUSTED_PROXIES": os.getenv("RATE_LIMIT_TRUSTED_PROXIES", ""),  # e.g. "10.0.0.0/8"; X-Forwarded-For is only read from these
+        "RATE_LIMIT_FAIL_OPEN": os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true",  # false: 503 while Redis is down; /login always refuses
+        "HEALTH_CHECK_INTERVAL_SECONDS": float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "5")),
+        "HEALTH_SMTP_CHECK_INTERVAL_SECONDS": float(os.getenv("HEALTH_SMTP_CHECK_INTERVAL_SECONDS", "300")),  # each probe is a connection to the provider
+        "HEALTH_CHECK_TIMEOUT_SECONDS": float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2")),
+        "HEALTH_CRITICAL_CHECKS": os.getenv("HEALTH_CRITICAL_CHECKS", "mongo,redis"),  # readiness needs these up
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),
+        "LOG_FILE": os.getenv("LOG_FILE", "app.log") or None,  # empty logs to stderr
+        "LOG_SAMPLE_RATES": os.getenv("LOG_SAMPLE_RATES", ""),  # e.g. "login=0.1"
+        "VERIFICATION_STORE": os.getenv("VERIFICATION_STORE", "mongo"),
+        "LOG_QUERY_PLANS": os.getenv("LOG_QUERY_PLANS", "true").lower() == "true",
+        "USER_CACHE_SIZE": int(os.getenv("USER_CACHE_SIZE", "10000")),
+        "USER_CACHE_TTL_SECONDS": float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
     }
\ No newline at end of file
@@ -2,15 +2,38 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ServerSelectionTimeoutError
 from config import load_config
 from bson import ObjectId
-from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datetime import datetime, timedelta
+from cache import user_cache
+from adid_index import advertising_id_index
+from email_hashes import email_hashes, HASH_PREFIX_LENGTH
+from common.advertising_id import ZERO_ADVERTISING_ID
+from common.mongo_monitoring import client_options
+from common.binary_advertising_id import to_binary_advertising_id, to_string_advertising_id, advertising_id_filter
+from indexes import ensure_indexes, log_query_plans
+from outbox_params import encrypt_params
+from logger import logger
 
 config = load_config()
-client = AsyncIOMotorClient(config["MONGO_DETAILS"], serverSelectionTimeoutMS=5000)
+client = AsyncIOMotorClient(
+    config["MONGO_DETAILS"],
+    serverSelectionTimeoutMS=5000,
+    **client_options(
+        max_pool_size=config["MONGO_MAX_POOL_SIZE"],
+        min_pool_size=config["MONGO_MIN_POOL_SIZE"],
+        wait_queue_timeout_ms=config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        slow_query_ms=config["MONGO_SLOW_QUERY_MS"],
+    )
+)
 database = client.users_db
 user_collection = database.get_collection("users")
 email_collection = database.get_collection("emails")
 device_collection = database.get_collection("devices")
 verification_collection = database.get_collection("verification_codes")
+outbox_collection = database.get_collection("email_outbox")
+hash_prefix_collection = database.get_collection("email_hash_prefixes")
+_indexes_ready = False
 
 async def get_user(email: str):
     return await user_collection.find_one({"email": email})
@@ -29,16 +52,19 @@ async def create_user(user_data: dict):
 
 async def update_user(user_id: str, update_data: dict):
     update_data["updated_at"] = datetime.utcnow()
-    return await user_collection.update_one(
+    result = await user_collection.update_one(
         {"_id": ObjectId(user_id)},
         {"$set": update_data}
     )
+    user_cache.invalidate(user_id)
+    return result
 
 async def add_email(user_id: str, email: str, is_verified: bool = False):
     now = datetime.utcnow()
     return await email_collection.insert_one({
         "user_id": ObjectId(user_id),
         "email": email,
+        **email_hashes(email),
         "is_verified": is_verified,
         "status": "created",
         "created_at": now,
@@ -53,31 +79,130 @@ async def verify_email(user_id: str, email: str):
     # Update the email record
     await email_collection.update_one(
         {"user_id": ObjectId(user_id), "email": email},
-        {"$set": {"is_verified": True, "status": "active", "updated_at": datetime.utcnow()}}
+        {"$set": {"is_verified": True, "status": "active", **email_hashes(email), "updated_at": datetime.utcnow()}}
     )
+    await sync_email_hash_prefix(email_hashes(email)["email_sha256"])
     
     # Update the user's verification status if not already verified
     await user_collection.update_one(
         {"_id": ObjectId(user_id), "is_verified": False},
         {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}}
     )
+    user_cache.invalidate(user_id)
 
 async def add_device(user_id: str, advertising_id: str):
-    if advertising_id == "00000000-0000-0000-0000-000000000000":
+    if advertising_id == ZERO_ADVERTISING_ID:
         return None  # Don't add the device if it's all zeros
     
     now = datetime.utcnow()
-    return await device_collection.insert_one({
-        "user_id": ObjectId(user_id),
-        "advertising_id": advertising_id,
-        "status": "active",
-        "created_at": now,
-        "updated_at": now
-    })
+    try:
+        result = await device_collection.insert_one({
+            "user_id": ObjectId(user_id),
+            "advertising_id": to_binary_advertising_id(advertising_id),
+            "status": "active",
+            "created_at": now,
+            "updated_at": now
+        })
+    except DuplicateKeyError:
+        # Already registered; adding it again re-activates it
+        await update_device_status(user_id, advertising_id, "active")
+        return None
+    advertising_id_index.add(advertising_id)
+    return result
+
+async def insert_many_unordered(collection, documents: list):
+    """
+    Returns ({index in documents: error message}, {indexes already stored})
+    for the rows the server rejected. Duplicate-key rejections are reported
+    separately, so re-running an import skips rows it already wrote.
+    """
+    if not documents:
+        return {}, set()
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        failed, existing = {}, set()
+        for err in e.details.get("writeErrors", []):
+            if err.get("code") == 11000:
+                existing.add(err["index"])
+            else:
+                failed[err["index"]] = err.get("errmsg", "write error")
+        return failed, existing
+    return {}, set()
+
+async def add_devices_bulk(user_id: str, advertising_ids: list):
+    now = datetime.utcnow()
+    owner = ObjectId(user_id)
+    failed, existing = await insert_many_unordered(device_collection, [
+        {
+            "user_id": owner,
+            "advertising_id": to_binary_advertising_id(advertising_id),
+            "status": "active",
+            "created_at": now,
+            "updated_at": now
+        }
+        for advertising_id in advertising_ids
+    ])
+    for index, advertising_id in enumerate(advertising_ids):
+        if index not in failed and index not in existing:
+            advertising_id_index.add(advertising_id)
+    return failed, existing
+
+async def add_emails_bulk(user_id: str, emails: list):
+    now = datetime.utcnow()
+    owner = ObjectId(user_id)
+    return await insert_many_unordered(email_collection, [
+        {
+            "user_id": owner,
+            "email": email,
+            **email_hashes(email),
+            "is_verified": False,
+            "status": "created",
+            "created_at": now,
+            "updated_at": now
+        }
+        for email in emails
+    ])
+
+async def get_unverified_email(email: str):
+    # Emails added to an account (one by one or in bulk) rather than registered with
+    return await email_collection.find_one({"email": email, "is_verified": False}, {"user_id": 1})
+
+async def find_opted_out_emails_by_hash(field: str, hashes: list):
+    # field is one of email_hashes.HASH_FIELDS; served by the emails.<field> index
+    cursor = email_collection.find(
+        {field: {"$in": hashes}, "status": "active", "is_verified": True},
+        {"user_id": 1, field: 1}
+    )
+    return await cursor.to_list(length=None)
+
+async def iter_devices_for_export(since: datetime | None, after: tuple | None, batch_size: int):
+    """
+    Streams devices in (updated_at, _id) order. A full export only includes
+    active devices; a delta since a timestamp includes every status so that
+    disables reach the brokers too. after=(updated_at, _id) resumes a
+    previous export just past that row.
+    """
+    query = {"updated_at": {"$gte": since}} if since else {"status": "active"}
+    if after:
+        after_updated_at, after_id = after
+        query = {"$and": [query, {"$or": [
+            {"updated_at": {"$gt": after_updated_at}},
+            {"updated_at": after_updated_at, "_id": {"$gt": after_id}}
+        ]}]}
+    cursor = device_collection.find(
+        query,
+        {"advertising_id": 1, "status": 1, "updated_at": 1}
+    ).sort([("updated_at", 1), ("_id", 1)]).batch_size(batch_size)
+    async for device in cursor:
+        yield device
 
 async def get_user_devices(user_id: str):
     cursor = device_collection.find({"user_id": ObjectId(user_id)})
-    return await cursor.to_list(length=None)
+    devices = await cursor.to_list(length=None)
+    for device in devices:
+        device["advertising_id"] = to_string_advertising_id(device["advertising_id"])
+    return devices
 
 async def store_verification_code(email: str, hashed_code: str, expiration_time, user_id: str):
     now = datetime.utcnow()
@@ -101,9 +226,17 @@ async def delete_verification_code(email: str):
 
 async def update_device_status(user_id: str, advertising_id: str, status: str):
     result = await device_collection.update_one(
-        {"user_id": ObjectId(user_id), "advertising_id": advertising_id},
+        {"user_id": ObjectId(user_id), "advertising_id": advertising_id_filter(advertising_id)},
         {"$set": {"status": status, "updated_at": datetime.utcnow()}}
     )
+    if result.modified_count > 0:
+        if status == "active":
+            advertising_id_index.add(advertising_id)
+        elif not await device_collection.find_one(
+            {"advertising_id": advertising_id_filter(advertising_id), "status": "active"}, {"_id": 1}
+        ):
+            # Other users may still have the same ID opted out
+            advertising_id_index.discard(advertising_id)
     return result.modified_count > 0
 
 async def update_email_status(user_id: str, email: str, status: str):
@@ -111,8 +244,34 @@ async def update_email_status(user_id: str, email: str, status: str):
         {"user_id": ObjectId(user_id), "email": email},
         {"$set": {"status": status, "updated_at": datetime.utcnow()}}
     )
+    if result.modified_count > 0:
+        await sync_email_hash_prefix(email_hashes(email)["email_sha256"])
     return result.modified_count > 0
 
+async def sync_email_hash_prefix(email_sha256: str):
+    """
+    Adds the hash to its prefix bucket while any verified, active email
+    still has it, and removes it otherwise (other users may share it).
+    Buckets are never deleted, so their version (the range ETag) never
+    goes back to a value a partner may have cached.
+    """
+    prefix, suffix = email_sha256[:HASH_PREFIX_LENGTH], email_sha256[HASH_PREFIX_LENGTH:]
+    active = await email_collection.find_one(
+        {"email_sha256": email_sha256, "status": "active", "is_verified": True}, {"_id": 1}
+    )
+    await hash_prefix_collection.update_one(
+        {"_id": prefix},
+        {
+            "$addToSet" if active else "$pull": {"suffixes": suffix},
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.utcnow()}
+        },
+        upsert=bool(active)
+    )
+
+async def get_hash_prefix_bucket(prefix: str):
+    return await hash_prefix_collection.find_one({"_id": prefix})
+
 async def get_user_emails_and_devices(user_id: str):
     emails = await get_user_emails(user_id)
     devices = await get_user_devices(user_id)
@@ -130,11 +289,79 @@ async def get_user_emails_and_devices(user_id: str):
     
     return {"emails": emails, "devices": devices}
 
+async def enqueue_email(kind: str, to_email: str, params: dict):
+    now = datetime.utcnow()
+    return await outbox_collection.insert_one({
+        "kind": kind,
+        "to_email": to_email,
+        # Encrypted so codes waiting to be sent aren't readable at rest
+        "params": encrypt_params(params),
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    })
+
+async def claim_outbox_email(worker_id: str, lock_seconds: int):
+    # Claims the oldest due message; "sending" messages whose lock has lapsed
+    # belong to a worker that died and are picked up again
+    now = datetime.utcnow()
+    return await outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "locked_until": {"$lte": now}}
+        ]},
+        {"$set": {
+            "status": "sending",
+            "locked_by": worker_id,
+            "locked_until": now + timedelta(seconds=lock_seconds),
+            "updated_at": now
+        }},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def mark_outbox_sent(message_id: ObjectId):
+    now = datetime.utcnow()
+    # Drop the payload once delivered so one-time codes don't linger in the outbox
+    await outbox_collection.update_one(
+        {"_id": message_id},
+        {"$set": {"status": "sent", "sent_at": now, "updated_at": now},
+         "$unset": {"params": "", "locked_by": "", "locked_until": ""}}
+    )
+
+async def mark_outbox_failed(message_id: ObjectId, attempts: int, error: str, retry_at: datetime | None):
+    now = datetime.utcnow()
+    update = {"attempts": attempts, "last_error": error, "updated_at": now}
+    unset = {"locked_by": "", "locked_until": ""}
+    if retry_at is None:
+        update.update({"status": "dead", "dead_at": now})
+        # A dead letter will never be sent, so its code has no reason to stay
+        unset["params"] = ""
+    else:
+        update.update({"status": "pending", "next_attempt_at": retry_at})
+    await outbox_collection.update_one(
+        {"_id": message_id},
+        {"$set": update, "$unset": unset}
+    )
+
 async def startup_db_client():
+    global _indexes_ready
     try:
         await client.server_info()
     except ServerSelectionTimeoutError:
         print("Unable to connect to the database. Please check your MongoDB connection.")
+        return
+
+    if not _indexes_ready:
+        try:
+            await ensure_indexes(database)
+            if config["LOG_QUERY_PLANS"]:
+                await log_query_plans(database)
+            _indexes_ready = True
+        except Exception as e:
+            logger.error(f"Index bootstrap failed: {str(e)}")
 
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
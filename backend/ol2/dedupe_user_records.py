@@ -0,0 +1,63 @@
+"""
+Removes duplicate (user_id, advertising_id) devices and (user_id, email)
+emails, then rebuilds those indexes as unique. Older deployments allowed the
+duplicates, and ensure_indexes won't turn an existing index unique on its
+own. Safe to re-run.
+
+For each duplicate group the row kept is the verified one (emails), then
+the most recently updated, since its status is the current one.
+
+Run migrate_advertising_ids.py first so that string and binary spellings
+of the same advertising ID are grouped together.
+
+    python dedupe_user_records.py [--dry-run]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from indexes import rebuild_unique_index
+from logger import logger
+
+# collection name -> (index name, field paired with user_id, sort picking the row to keep)
+TARGETS = {
+    "devices": ("user_id_advertising_id", "advertising_id", {"updated_at": -1}),
+    "emails": ("user_id_email", "email", {"is_verified": -1, "updated_at": -1}),
+}
+
+async def remove_duplicates(collection, field: str, keep_first: dict, dry_run: bool) -> int:
+    cursor = collection.aggregate([
+        {"$sort": keep_first},
+        {"$group": {"_id": {"user_id": "$user_id", field: f"${field}"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    removed = 0
+    async for group in cursor:
+        extra = group["ids"][1:]
+        if not dry_run:
+            await collection.delete_many({"_id": {"$in": extra}})
+        removed += len(extra)
+    return removed
+
+async def main(dry_run: bool):
+    await database.startup_db_client()
+    try:
+        for collection_name, (index_name, field, keep_first) in TARGETS.items():
+            collection = database.database.get_collection(collection_name)
+            removed = await remove_duplicates(collection, field, keep_first, dry_run)
+            logger.info(f"{collection_name}: {removed} duplicate rows {'found' if dry_run else 'removed'}")
+            if not dry_run and not await rebuild_unique_index(database.database, collection_name, index_name):
+                logger.error(f"{collection_name}.{index_name} is still not unique; re-run once writes have settled")
+    finally:
+        await database.shutdown_db_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Count duplicates without removing anything")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
@@ -0,0 +1,20 @@
+import hashlib
+
+# Brokers hash the trimmed, lower-cased address; keep ours identical so hashes join
+HASH_FIELDS = {"sha256": "email_sha256", "md5": "email_md5"}
+HASH_LENGTHS = {64: "sha256", 32: "md5"}
+# Range queries bucket SHA-256 hashes by their first five hex characters (~1M buckets)
+HASH_PREFIX_LENGTH = 5
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def email_hashes(email: str) -> dict:
+    """
+    Returns the hashed-email fields stored next to each email record.
+    """
+    normalized = normalize_email(email).encode()
+    return {
+        "email_sha256": hashlib.sha256(normalized).hexdigest(),
+        "email_md5": hashlib.md5(normalized).hexdigest(),
+    }
@@ -0,0 +1,122 @@
+import base64
+import hmac
+import json
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Header
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from database import iter_devices_for_export
+from bloom import read_manifest
+from common.binary_advertising_id import to_string_advertising_id
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+EPOCH = datetime(1970, 1, 1)
+ROWS_PER_CHUNK = 1000
+CSV_COLUMNS = ("advertising_id", "status", "updated_at", "cursor")
+
+async def require_export_api_key(x_api_key: str = Header(None)):
+    expected = config["EXPORT_API_KEY"]
+    if not expected or not x_api_key or not hmac.compare_digest(x_api_key, expected):
+        raise HTTPException(status_code=401, detail="Invalid export API key")
+
+def encode_cursor(updated_at: datetime, device_id: ObjectId) -> str:
+    millis = (updated_at - EPOCH) // timedelta(milliseconds=1)
+    return base64.urlsafe_b64encode(f"{millis}:{device_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(token: str):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        millis, device_id = raw.split(":")
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(device_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+
+def _row(device):
+    return {
+        "advertising_id": to_string_advertising_id(device["advertising_id"]),
+        "status": device["status"],
+        "updated_at": device["updated_at"].isoformat(),
+        "cursor": encode_cursor(device["updated_at"], device["_id"]),
+    }
+
+def _csv_line(row) -> str:
+    # Advertising IDs, statuses, timestamps and cursors never contain commas or quotes
+    return ",".join(row[column] for column in CSV_COLUMNS) + "\n"
+
+async def _iter_text_chunks(since, after, line_format):
+    lines = []
+    count = 0
+    async for device in iter_devices_for_export(since, after, config["EXPORT_BATCH_SIZE"]):
+        lines.append(line_format(_row(device)))
+        count += 1
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+    logger.info(f"Export finished: {count} advertising IDs")
+
+async def _ndjson_stream(since, after):
+    async for text in _iter_text_chunks(since, after, lambda row: json.dumps(row) + "\n"):
+        yield text.encode()
+
+async def _gzip_csv_stream(since, after):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    yield compressor.compress(",".join(CSV_COLUMNS).encode() + b"\n")
+    async for text in _iter_text_chunks(since, after, _csv_line):
+        data = compressor.compress(text.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_advertising_ids(export_format: str, since: datetime | None, cursor: str | None):
+    """
+    Streams active advertising IDs (or every change since `since`) straight
+    from a batched cursor. Every row carries a cursor token; passing the last
+    one received resumes the export just after that row.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if since is not None and since.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    logger.info(f"Export started: format={export_format}, since={since}, resumed={after is not None}")
+    if export_format == "ndjson":
+        return StreamingResponse(_ndjson_stream(since, after), media_type="application/x-ndjson")
+    if export_format == "csv.gz":
+        return StreamingResponse(
+            _gzip_csv_stream(since, after),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="advertising_ids.csv.gz"'}
+        )
+    raise HTTPException(status_code=400, detail="format must be ndjson or csv.gz")
+
+def bloom_manifest():
+    manifest = read_manifest(config["BLOOM_SNAPSHOT_DIR"])
+    if not manifest.get("full"):
+        raise HTTPException(status_code=503, detail="No Bloom filter snapshot has been published yet")
+    return manifest
+
+def serve_bloom_snapshot(kind: str, if_none_match: str = None):
+    """
+    Serves the current full or delta snapshot. Each snapshot file is
+    immutable, so its ETag is just its version and partners polling with
+    If-None-Match only download a snapshot once.
+    """
+    entry = bloom_manifest().get(kind)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"No {kind} Bloom filter snapshot is available")
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if if_none_match and entry["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        os.path.join(config["BLOOM_SNAPSHOT_DIR"], entry["file"]),
+        media_type="application/octet-stream",
+        filename=entry["file"],
+        headers=headers
+    )
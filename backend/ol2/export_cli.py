@@ -0,0 +1,97 @@
+"""
+Downloads the advertising ID opt-out export to a local file, resuming from the
+last complete row if the file already exists.
+
+    python export_cli.py --url https://api.example.com --api-key KEY --out ids.csv --format csv
+    python export_cli.py --url https://api.example.com --api-key KEY --out delta.ndjson --since 2024-10-01T00:00:00Z
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import zlib
+import httpx
+
+def last_cursor(path: str, export_format: str):
+    """
+    Truncates a trailing partial line left by an interrupted download and
+    returns the cursor of the last complete row, or None to start fresh.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        # Scan back from the end for the last newline in 64 KiB steps
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            block = f.read(end - start)
+            index = block.rfind(b"\n")
+            if index != -1:
+                complete = start + index + 1
+                break
+            end = start
+        else:
+            complete = 0
+        f.truncate(complete)
+        if complete == 0:
+            return None
+        # Find the start of the last complete line
+        start = max(0, complete - 65536)
+        f.seek(start)
+        line = f.read(complete - start).rstrip(b"\n").rsplit(b"\n", 1)[-1].decode()
+    if export_format == "ndjson":
+        return json.loads(line)["cursor"]
+    row = next(csv.reader([line]))
+    return None if row[-1] == "cursor" else row[-1]
+
+def download(url: str, api_key: str, out: str, export_format: str, since: str | None):
+    cursor = last_cursor(out, export_format)
+    params = {"format": "ndjson" if export_format == "ndjson" else "csv.gz"}
+    if since:
+        params["since"] = since
+    if cursor:
+        params["cursor"] = cursor
+        print(f"Resuming after cursor {cursor}", file=sys.stderr)
+
+    # A resumed CSV already has its header row
+    has_header = os.path.exists(out) and os.path.getsize(out) > 0
+    rows = 0
+    with open(out, "ab") as f, httpx.Client(timeout=httpx.Timeout(30.0, read=None)) as client:
+        with client.stream("GET", f"{url.rstrip('/')}/export/advertising-ids", params=params,
+                           headers={"X-API-Key": api_key}) as response:
+            response.raise_for_status()
+            decompressor = zlib.decompressobj(31) if export_format == "csv" else None
+            skip_header = has_header and decompressor is not None
+            for chunk in response.iter_bytes():
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                if skip_header and data:
+                    newline = data.find(b"\n")
+                    if newline == -1:
+                        continue
+                    data = data[newline + 1:]
+                    skip_header = False
+                f.write(data)
+                rows += data.count(b"\n")
+            if decompressor:
+                f.write(decompressor.flush())
+    print(f"Wrote {rows} rows to {out}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Base URL of the ol2 API")
+    parser.add_argument("--api-key", default=os.getenv("EXPORT_API_KEY"), help="Defaults to $EXPORT_API_KEY")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson",
+                        help="csv is transferred gzip-compressed and written uncompressed")
+    parser.add_argument("--since", help="ISO timestamp; export every change since then instead of all active IDs")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("--api-key or $EXPORT_API_KEY is required")
+    download(args.url, args.api_key, args.out, args.format, args.since)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import re
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pymongo import UpdateOne
+import database
+from email_hashes import HASH_PREFIX_LENGTH
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+PREFIX_PATTERN = re.compile(f"[0-9a-f]{{{HASH_PREFIX_LENGTH}}}")
+
+def _render(prefix: str, suffixes: list, format: str) -> tuple:
+    if format == "binary":
+        # 30 bytes per hash: everything after the first two bytes. The high
+        # nibble of each record repeats the last prefix character.
+        return b"".join(bytes.fromhex(prefix[-1] + suffix) for suffix in suffixes), "application/octet-stream"
+    return "".join(f"{suffix}\n" for suffix in suffixes).encode(), "text/plain"
+
+async def email_hash_range(prefix: str, format: str, if_none_match: str = None):
+    """
+    Returns the SHA-256 suffixes of every verified, active email whose hash
+    starts with prefix, so a partner can check an email without sending us
+    its full hash. Buckets are maintained as emails are verified or disabled.
+    """
+    prefix = prefix.lower()
+    if not PREFIX_PATTERN.fullmatch(prefix):
+        raise HTTPException(status_code=400, detail=f"Prefix must be {HASH_PREFIX_LENGTH} hex characters")
+
+    bucket = await database.get_hash_prefix_bucket(prefix) or {}
+    headers = {
+        "ETag": f'"{prefix}-{bucket.get("version", 0)}-{format}"',
+        "Cache-Control": f"max-age={config['HASH_RANGE_CACHE_SECONDS']}",
+    }
+    if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    body, media_type = _render(prefix, sorted(bucket.get("suffixes", [])), format)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def rebuild_hash_prefix_buckets(batch_size: int = 1000):
+    """
+    Rebuilds every prefix bucket from the emails collection, walking hashes
+    in index order so only one bucket is held in memory at a time. Buckets
+    left with no hashes are emptied at the end rather than removed: a
+    bucket's version only ever goes up, so an ETag is never handed out
+    twice for different contents.
+    """
+    started = datetime.utcnow()
+    cursor = database.email_collection.find(
+        {"status": "active", "is_verified": True, "email_sha256": {"$exists": True}},
+        {"email_sha256": 1, "_id": 0}
+    ).sort("email_sha256", 1).batch_size(batch_size)
+    operations = []
+    prefix, suffixes = None, set()
+    buckets = 0
+
+    async def flush():
+        nonlocal operations
+        if operations:
+            await database.hash_prefix_collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    def finish_bucket():
+        nonlocal buckets
+        operations.append(UpdateOne(
+            {"_id": prefix},
+            {"$set": {"suffixes": sorted(suffixes), "updated_at": started}, "$inc": {"version": 1}},
+            upsert=True
+        ))
+        buckets += 1
+
+    async for record in cursor:
+        email_sha256 = record["email_sha256"]
+        if email_sha256[:HASH_PREFIX_LENGTH] != prefix:
+            if prefix is not None:
+                finish_bucket()
+                if len(operations) >= batch_size:
+                    await flush()
+            prefix, suffixes = email_sha256[:HASH_PREFIX_LENGTH], set()
+        suffixes.add(email_sha256[HASH_PREFIX_LENGTH:])
+    if prefix is not None:
+        finish_bucket()
+    await flush()
+    stale = await database.hash_prefix_collection.update_many(
+        {"updated_at": {"$lt": started}, "suffixes": {"$ne": []}},
+        {"$set": {"suffixes": [], "updated_at": started}, "$inc": {"version": 1}}
+    )
+    logger.info(f"Rebuilt {buckets} email hash prefix buckets, emptied {stale.modified_count} stale ones")
+    return buckets
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from passlib.context import CryptContext
+from common.metrics import time_downstream
+from config import load_config
+
+config = load_config()
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = None
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_executor():
+    """
+    Returns the executor bcrypt runs on, creating it on first use. bcrypt
+    releases the GIL, so threads are enough to keep the event loop free;
+    a process pool can be selected to spread hashing over more cores.
+    """
+    global _executor
+    if _executor is None:
+        workers = config["PASSWORD_HASH_WORKERS"]
+        if config["PASSWORD_HASH_EXECUTOR"] == "process":
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _executor
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    with time_downstream("bcrypt", "hash"):
+        return await loop.run_in_executor(get_executor(), _hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    with time_downstream("bcrypt", "verify"):
+        return await loop.run_in_executor(get_executor(), _verify, plain_password, hashed_password)
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
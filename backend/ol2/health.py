@@ -0,0 +1,141 @@
+import asyncio
+import time
+from datetime import datetime
+from common.metrics import Gauge
+import database
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+CHECK_UP = Gauge("health_check_up", "1 if the dependency answered the last health probe", ("check",))
+CHECK_LATENCY = Gauge("health_check_latency_seconds", "Round trip of the last health probe", ("check",))
+
+
+async def check_mongo():
+    await database.client.admin.command("ping")
+
+def redis_check(redis_client):
+    async def check_redis():
+        await redis_client.ping()
+    return check_redis
+
+async def check_smtp():
+    # Connect and read the greeting only; logging in on every probe would count against the provider's limits
+    reader, writer = await asyncio.open_connection(config["EMAIL_HOST"], config["EMAIL_PORT"])
+    try:
+        greeting = await reader.readline()
+        if not greeting.startswith(b"220"):
+            raise ConnectionError(f"Unexpected SMTP greeting: {greeting[:80]!r}")
+        writer.write(b"QUIT\r\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+class HealthProber:
+    """
+    Probes Mongo, Redis and SMTP in the background and keeps the latest
+    result in memory, so health endpoints never touch a dependency
+    themselves. Each round runs every check concurrently with a timeout, so
+    one hung dependency can't stall the others or the round.
+
+    A check can be given a longer interval in check_intervals (the SMTP
+    probe opens a connection to the mail provider from every worker); rounds
+    in between keep its last result.
+
+    Liveness only says the prober (and so the event loop) is still making
+    rounds. Readiness also needs every critical check to be up.
+    """
+
+    def __init__(self, timeout: float, interval: float, critical=("mongo", "redis"), check_intervals=None):
+        self.timeout = timeout
+        self.interval = interval
+        self.critical = frozenset(critical)
+        self.check_intervals = dict(check_intervals or {})
+        self._last_run = {}  # check name -> monotonic time it was last started
+        # A round takes at most timeout; allow a few missed rounds before calling the process stuck
+        self.stale_after = 3 * interval + timeout
+        self.checks = {}
+        self.results = {}
+        self.checked_at = None  # monotonic time of the last completed round
+        self.checked_at_utc = None
+        self.started_at = time.monotonic()
+
+    async def _run_check(self, name, check):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+            result = {"status": "up"}
+        except Exception as e:
+            error = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+            result = {"status": "down", "error": error}
+        latency = time.perf_counter() - started
+        result["latency_ms"] = round(latency * 1000, 1)
+        CHECK_UP.set(1 if result["status"] == "up" else 0, name)
+        CHECK_LATENCY.set(latency, name)
+        return name, result
+
+    def _due(self, now: float):
+        return {
+            name: check for name, check in self.checks.items()
+            if name not in self._last_run or now - self._last_run[name] >= self.check_intervals.get(name, self.interval)
+        }
+
+    async def probe(self):
+        now = time.monotonic()
+        due = self._due(now)
+        self._last_run.update(dict.fromkeys(due, now))
+        results = dict(await asyncio.gather(*(self._run_check(name, check) for name, check in due.items())))
+        for name, result in results.items():
+            previous = self.results.get(name, {}).get("status")
+            if result["status"] != previous and (previous or result["status"] == "down"):
+                logger.warning("Health check %s is %s: %s", name, result["status"], result.get("error", "ok"))
+        # Swapped whole so readers never see a half-updated round
+        self.results = {**self.results, **results}
+        self.checked_at = time.monotonic()
+        self.checked_at_utc = datetime.utcnow()
+
+    async def run(self, checks: dict):
+        self.checks = checks
+        self.started_at = time.monotonic()
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error("Health probe round failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def _age(self):
+        return None if self.checked_at is None else time.monotonic() - self.checked_at
+
+    def liveness(self):
+        age = self._age()
+        # Not probed yet counts as alive until the first round is overdue
+        since = age if age is not None else time.monotonic() - self.started_at
+        alive = since <= self.stale_after
+        return alive, {"status": "alive" if alive else "stalled", "last_probe_age_s": None if age is None else round(age, 1)}
+
+    def readiness(self):
+        age = self._age()
+        results = self.results
+        if age is None:
+            ready, status = False, "starting"
+        elif age > self.stale_after:
+            ready, status = False, "stale"
+        else:
+            ready = all(results.get(name, {}).get("status") == "up" for name in self.critical)
+            status = "ready" if ready else "unavailable"
+        return ready, {
+            "status": status,
+            "checked_at": self.checked_at_utc.isoformat() + "Z" if self.checked_at_utc else None,
+            "checks": results,
+        }
+
+
+health_prober = HealthProber(
+    timeout=config["HEALTH_CHECK_TIMEOUT_SECONDS"],
+    interval=config["HEALTH_CHECK_INTERVAL_SECONDS"],
+    critical=[name.strip() for name in config["HEALTH_CRITICAL_CHECKS"].split(",") if name.strip()],
+    check_intervals={"smtp": config["HEALTH_SMTP_CHECK_INTERVAL_SECONDS"]},
+)
@@ -0,0 +1,163 @@
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from common.binary_advertising_id import to_binary_advertising_id
+from logger import logger
+
+# collection name -> index name -> (keys, options)
+INDEXES = {
+    "users": {
+        "email_unique": ([("email", ASCENDING)], {"unique": True}),
+    },
+    "emails": {
+        # Unique so repeated adds and re-run bulk imports can't duplicate a row
+        "user_id_email": ([("user_id", ASCENDING), ("email", ASCENDING)], {"unique": True}),
+        "email": ([("email", ASCENDING)], {}),
+        # Bloom snapshot builds: full builds filter on status, deltas add updated_at
+        "status_updated_at": ([("status", ASCENDING), ("updated_at", ASCENDING)], {}),
+        # Suppression-list matching joins broker hashes against these
+        "email_sha256": ([("email_sha256", ASCENDING)], {}),
+        "email_md5": ([("email_md5", ASCENDING)], {}),
+    },
+    "devices": {
+        "user_id_advertising_id": ([("user_id", ASCENDING), ("advertising_id", ASCENDING)], {"unique": True}),
+        # Export order: full exports filter on status, deltas only on updated_at
+        "status_updated_at_id": ([("status", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)], {}),
+        "updated_at_id": ([("updated_at", ASCENDING), ("_id", ASCENDING)], {}),
+        "advertising_id_status": ([("advertising_id", ASCENDING), ("status", ASCENDING)], {}),
+    },
+    "verification_codes": {
+        "email_unique": ([("email", ASCENDING)], {"unique": True}),
+        # expireAfterSeconds=0 lets the server delete each code once expiration_time has passed
+        "expiration_time_ttl": ([("expiration_time", ASCENDING)], {"expireAfterSeconds": 0}),
+    },
+    "email_outbox": {
+        "status_next_attempt_at": ([("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        # Delivered messages are kept for a week for auditing, then removed by the server
+        "sent_at_ttl": ([("sent_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+        "dead_at_ttl": ([("dead_at", ASCENDING)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    },
+}
+
+# Filters shaped like the ones database.py sends on hot paths
+HOT_QUERIES = {
+    "users": [{"email": "explain@example.com"}],
+    "emails": [
+        {"user_id": ObjectId()},
+        {"user_id": ObjectId(), "email": "explain@example.com"},
+        {"email_sha256": {"$in": ["0" * 64]}, "status": "active", "is_verified": True},
+    ],
+    "devices": [
+        {"user_id": ObjectId()},
+        {"user_id": ObjectId(), "advertising_id": to_binary_advertising_id("00000000-0000-0000-0000-000000000001")},
+    ],
+    "verification_codes": [{"email": "explain@example.com"}],
+}
+
+_COMPARED_OPTIONS = ("unique", "expireAfterSeconds", "sparse", "partialFilterExpression")
+
+def _matches(existing: dict, keys, options: dict) -> bool:
+    if [tuple(k) for k in existing["key"]] != [tuple(k) for k in keys]:
+        return False
+    return all(existing.get(opt) == options.get(opt) for opt in _COMPARED_OPTIONS)
+
+async def _rebuild_index(collection, name: str, existing: dict, keys, options: dict):
+    # MongoDB won't hold two indexes with the same keys, so the old one has to
+    # go first. If the new one then can't be built, put the old one back
+    # rather than leave the collection unindexed.
+    await collection.drop_index(name)
+    try:
+        await collection.create_index(keys, name=name, **options)
+        logger.info(f"Rebuilt index {collection.name}.{name}")
+        return True
+    except OperationFailure as e:
+        logger.error(f"Could not rebuild index {collection.name}.{name}, restoring the old one: {str(e)}")
+        previous = {opt: existing[opt] for opt in _COMPARED_OPTIONS if opt in existing}
+        await collection.create_index([tuple(k) for k in existing["key"]], name=name, **previous)
+        return False
+
+async def ensure_indexes(database):
+    """
+    Creates the declared indexes, and rebuilds any index whose name matches a
+    declaration but whose keys or options have drifted. Unique indexes are
+    never rebuilt automatically, since existing duplicates can keep the new
+    one from building; their drift is logged for a manual migration. Safe to
+    call on every startup.
+    """
+    for collection_name, declared in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        existing = await collection.index_information()
+        for name, (keys, options) in declared.items():
+            if name in existing:
+                if _matches(existing[name], keys, options):
+                    continue
+                if options.get("unique") or existing[name].get("unique"):
+                    logger.error(f"Unique index {collection_name}.{name} differs from its declaration; leaving it in place")
+                    continue
+                logger.info(f"Index {collection_name}.{name} changed, rebuilding")
+                await _rebuild_index(collection, name, existing[name], keys, options)
+                continue
+            if any(_matches(info, keys, options) for info in existing.values()):
+                # Same index already exists under another name
+                continue
+            try:
+                await collection.create_index(keys, name=name, **options)
+                logger.info(f"Created index {collection_name}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicates blocking a unique index; keep serving and surface it
+                logger.error(f"Could not create index {collection_name}.{name}: {str(e)}")
+
+async def rebuild_unique_index(database, collection_name: str, name: str):
+    """
+    Brings a unique index that ensure_indexes left alone in line with its
+    declaration. Duplicates have to be removed first (see
+    dedupe_user_records.py); if they haven't been, the old index is kept and
+    this returns False.
+    """
+    keys, options = INDEXES[collection_name][name]
+    collection = database.get_collection(collection_name)
+    existing = await collection.index_information()
+    if name in existing:
+        if _matches(existing[name], keys, options):
+            return True
+        return await _rebuild_index(collection, name, existing[name], keys, options)
+    try:
+        await collection.create_index(keys, name=name, **options)
+    except OperationFailure as e:
+        logger.error(f"Could not create index {collection_name}.{name}: {str(e)}")
+        return False
+    logger.info(f"Created index {collection_name}.{name}")
+    return True
+
+def _winning_stages(plan: dict):
+    # Slot-based-engine explains nest the classic plan under "queryPlan"
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stage = plan.get("stage")
+        if stage:
+            stages.append(f"{stage}({plan['indexName']})" if "indexName" in plan else stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+async def log_query_plans(database):
+    """
+    Logs the winning plan of each hot query so a collection scan shows up in
+    the startup logs.
+    """
+    for collection_name, filters in HOT_QUERIES.items():
+        collection = database.get_collection(collection_name)
+        for query_filter in filters:
+            try:
+                explain = await collection.find(query_filter).explain()
+            except Exception as e:
+                # Diagnostics only; never block startup on them
+                logger.warning(f"Could not explain query on {collection_name}: {str(e)}")
+                continue
+            stages = _winning_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+            shape = sorted(query_filter.keys())
+            message = f"Query plan {collection_name} {shape}: {' <- '.join(stages)}"
+            if "COLLSCAN" in stages:
+                logger.warning(message)
+            else:
+                logger.info(message)
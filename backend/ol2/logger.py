@@ -1,23 +1,16 @@
 import logging
-from logging.handlers import RotatingFileHandler
+from common.structured_logging import setup_logging, parse_sample_rates
+from config import load_config
 
 def setup_logger():
-    logger = logging.getLogger("myapp")
-    logger.setLevel(logging.INFO)
-
-    # Create a rotating file handler
-    file_handler = RotatingFileHandler(
-        "app.log", maxBytes=10*1024*1024, backupCount=5
+    config = load_config()
+    # Configure the root logger so records from the shared common modules land in the same file
+    setup_logging(
+        level=config["LOG_LEVEL"],
+        path=config["LOG_FILE"],
+        sample_rates=parse_sample_rates(config["LOG_SAMPLE_RATES"])
     )
-    
-    # Create a formatter and add it to the handler
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-
-    # Add the handler to the logger
-    logger.addHandler(file_handler)
-
-    return logger
+    return logging.getLogger("myapp")
 
 # Create a logger instance
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
@@ -1,5 +1,11 @@
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from pydantic import EmailStr
@@ -27,23 +33,54 @@ from auth import (
 from config import load_config
 from middleware import setup_middlewares
 from error_handlers import validation_exception_handler, generic_exception_handler
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+from common.rate_limit import RateLimit, init_rate_limiter
+from common.metrics import setup_metrics
 import redis.asyncio as redis
 from logger import logger
+from utils import smtp_pool
+from hashing import shutdown_executor
+from verification_store import init_verification_store
+from bulk_import import import_advertising_ids, import_emails
+from export import export_advertising_ids, require_export_api_key, bloom_manifest, serve_bloom_snapshot
+from adid_index import advertising_id_index, shutdown_executor as shutdown_index_executor
+from suppression import match_suppression_list
+from hash_ranges import email_hash_range
+from health import health_prober, check_mongo, redis_check, check_smtp
+from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import Optional, List
+import asyncio
+import database
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await startup_db_client()
     # Initialize rate limiter
-    redis_client = redis.from_url("redis://localhost", encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(redis_client)
+    redis_client = redis.from_url(config["REDIS_URL"], encoding="utf-8", decode_responses=True)
+    init_rate_limiter(
+        redis_client, trusted_proxies=config["RATE_LIMIT_TRUSTED_PROXIES"], fail_open=config["RATE_LIMIT_FAIL_OPEN"]
+    )
+    init_verification_store(redis_client)
+    index_task = None
+    if config["ADID_INDEX_ENABLED"]:
+        index_task = asyncio.create_task(
+            advertising_id_index.run_refresh(database.device_collection, config["ADID_INDEX_REFRESH_SECONDS"])
+        )
+    health_task = asyncio.create_task(
+        health_prober.run({"mongo": check_mongo, "redis": redis_check(redis_client), "smtp": check_smtp})
+    )
     
     yield
     
     # Shutdown
+    health_task.cancel()
+    if index_task:
+        index_task.cancel()
     await shutdown_db_client()
+    smtp_pool.close()
+    shutdown_executor()
+    shutdown_index_executor()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -63,6 +100,7 @@ app.add_middleware(
 
 # Setup secure headers middleware
 setup_middlewares(app)
+setup_metrics(app)
 
 config = load_config()
 
@@ -71,86 +109,151 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 
 @app.post("/register")
-async def register(
-    input_data: RegisterInput,
-    background_tasks: BackgroundTasks = BackgroundTasks()
-):
-    logger.info(f"Registration attempt for email: {input_data.email}")
-    return await register_user(input_data.email, input_data.password, input_data.advertising_id, background_tasks)
+async def register(input_data: RegisterInput):
+    logger.info("Registration attempt for email: %s", input_data.email, extra={"sample": "register"})
+    return await register_user(input_data.email, input_data.password, input_data.advertising_id)
 
-@app.post("/login", response_model=Token, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+@app.post("/login", response_model=Token, dependencies=[Depends(RateLimit("5/minute", fail_open=False))])
 async def login_endpoint(login_data: LoginInput):
-    logger.info(f"Login attempt for email: {login_data.email}")
+    logger.info("Login attempt for email: %s", login_data.email, extra={"sample": "login"})
     return await login_user(login_data.email, login_data.password)
 
 @app.post("/verify-email")
 async def verify_email_endpoint(verify_data: VerifyEmailInput):
-    logger.info(f"Email verification attempt for: {verify_data.email}")
+    logger.info("Email verification attempt for: %s", verify_data.email)
     return await verify_email(verify_data.email, verify_data.code)
 
 @app.post("/resend-verification")
-async def resend_verification_endpoint(
-    resend_data: ResendVerificationInput,
-    background_tasks: BackgroundTasks = BackgroundTasks()
-):
-    logger.info(f"Resending verification email for: {resend_data.email}")
-    return await resend_verification(resend_data.email, background_tasks)
+async def resend_verification_endpoint(resend_data: ResendVerificationInput):
+    logger.info("Resending verification email for: %s", resend_data.email)
+    return await resend_verification(resend_data.email)
 
 @app.put("/update-user")
-async def update_user(user_update: UserUpdate, current_user: dict = Depends(get_current_user)):
-    logger.info(f"User update attempt for user ID: {current_user['_id']}")
-    return await update_user_data(str(current_user["_id"]), user_update)
+async def update_user(user_update: UserUpdate, current_user: User = Depends(get_current_user)):
+    logger.info("User update attempt for user ID: %s", current_user.id)
+    return await update_user_data(str(current_user.id), user_update)
 
 @app.post("/add-email")
-async def add_new_email(email_add: EmailAdd, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
-    logger.info(f"Adding new email for user ID: {current_user['_id']}")
-    return await add_email_to_user(str(current_user["_id"]), email_add, background_tasks)
+async def add_new_email(email_add: EmailAdd, current_user: User = Depends(get_current_user)):
+    logger.info("Adding new email for user ID: %s", current_user.id)
+    return await add_email_to_user(str(current_user.id), email_add)
 
 @app.post("/add-advertising-id")
-async def add_new_advertising_id(ad_id_add: AdvertisingIdAdd, current_user: dict = Depends(get_current_user)):
-    logger.info(f"Adding new advertising ID for user ID: {current_user['_id']}")
-    return await add_advertising_id_to_user(str(current_user["_id"]), ad_id_add)
+async def add_new_advertising_id(ad_id_add: AdvertisingIdAdd, current_user: User = Depends(get_current_user)):
+    logger.info("Adding new advertising ID for user ID: %s", current_user.id)
+    return await add_advertising_id_to_user(str(current_user.id), ad_id_add)
+
+@app.post("/bulk/advertising-ids")
+async def bulk_add_advertising_ids(request: Request, current_user: User = Depends(get_current_user)):
+    logger.info("Bulk advertising ID import for user ID: %s", current_user.id)
+    return await import_advertising_ids(request, current_user.id)
+
+@app.post("/bulk/emails")
+async def bulk_add_emails(
+    request: Request, send_verification: bool = False, current_user: User = Depends(get_current_user)
+):
+    logger.info("Bulk email import for user ID: %s", current_user.id)
+    return await import_emails(request, current_user.id, send_verification)
+
+@app.get("/export/advertising-ids", dependencies=[Depends(require_export_api_key)])
+async def export_advertising_ids_endpoint(
+    format: str = Query("ndjson", pattern="^(ndjson|csv\\.gz)$"),
+    since: Optional[datetime] = None,
+    cursor: Optional[str] = None
+):
+    return export_advertising_ids(format, since, cursor)
+
+@app.get("/opt-outs/advertising-ids/{advertising_id}", dependencies=[Depends(require_export_api_key)])
+async def check_advertising_id_opt_out(advertising_id: str):
+    if not advertising_id_index.ready:
+        raise HTTPException(status_code=503, detail="Opt-out index is still loading")
+    return {"advertising_id": advertising_id, "opted_out": advertising_id_index.contains(advertising_id)}
+
+@app.post("/opt-outs/advertising-ids/lookup", dependencies=[Depends(require_export_api_key)])
+async def check_advertising_id_opt_outs(advertising_ids: List[str]):
+    if not advertising_id_index.ready:
+        raise HTTPException(status_code=503, detail="Opt-out index is still loading")
+    if len(advertising_ids) > config["ADID_LOOKUP_MAX_BATCH"]:
+        raise HTTPException(status_code=413, detail=f"At most {config['ADID_LOOKUP_MAX_BATCH']} IDs per lookup")
+    return {"opted_out": advertising_id_index.contains_many(advertising_ids)}
+
+@app.post("/opt-outs/emails/match", dependencies=[Depends(require_export_api_key)])
+async def match_email_suppression_list(request: Request):
+    return await match_suppression_list(request)
+
+@app.get("/opt-outs/emails/range/{prefix}", dependencies=[Depends(require_export_api_key)])
+async def get_email_hash_range(
+    prefix: str,
+    format: str = Query("text", pattern="^(text|binary)$"),
+    if_none_match: Optional[str] = Header(None)
+):
+    return await email_hash_range(prefix, format, if_none_match)
+
+@app.get("/opt-outs/bloom/manifest", dependencies=[Depends(require_export_api_key)])
+async def get_bloom_manifest():
+    return bloom_manifest()
+
+@app.get("/opt-outs/bloom/full", dependencies=[Depends(require_export_api_key)])
+async def get_bloom_full(if_none_match: Optional[str] = Header(None)):
+    return serve_bloom_snapshot("full", if_none_match)
+
+@app.get("/opt-outs/bloom/delta", dependencies=[Depends(require_export_api_key)])
+async def get_bloom_delta(if_none_match: Optional[str] = Header(None)):
+    return serve_bloom_snapshot("delta", if_none_match)
 
 @app.post("/forgot-password")
-async def forgot_password_request(email: EmailStr, background_tasks: BackgroundTasks):
-    logger.info(f"Password reset request for email: {email}")
-    return await forgot_password(email, background_tasks)
+async def forgot_password_request(email: EmailStr):
+    logger.info("Password reset request for email: %s", email)
+    return await forgot_password(email)
 
 @app.post("/reset-password")
 async def reset_password_request(email: EmailStr, reset_code: str, new_password: str):
-    logger.info(f"Password reset attempt for email: {email}")
+    logger.info("Password reset attempt for email: %s", email)
     return await reset_password(email, reset_code, new_password)
 
 @app.put("/disable-advertising-id/{advertising_id}")
-async def disable_advertising_id(advertising_id: str, current_user: dict = Depends(get_current_user)):
-    logger.info(f"Disabling advertising ID for user ID: {current_user['_id']}")
-    result = await update_device_status(str(current_user["_id"]), advertising_id, "disabled")
+async def disable_advertising_id(advertising_id: str, current_user: User = Depends(get_current_user)):
+    logger.info("Disabling advertising ID for user ID: %s", current_user.id)
+    result = await update_device_status(str(current_user.id), advertising_id, "disabled")
     return {"message": "Advertising ID disabled successfully"} if result else {"message": "Advertising ID not found"}
 
 @app.put("/disable-email/{email}")
-async def disable_email(email: EmailStr, current_user: dict = Depends(get_current_user)):
-    logger.info(f"Disabling email for user ID: {current_user['_id']}")
-    result = await update_email_status(str(current_user["_id"]), email, "disabled")
+async def disable_email(email: EmailStr, current_user: User = Depends(get_current_user)):
+    logger.info("Disabling email for user ID: %s", current_user.id)
+    result = await update_email_status(str(current_user.id), email, "disabled")
     return {"message": "Email disabled successfully"} if result else {"message": "Email not found"}
 
 @app.get("/user-data")
 async def get_user_data(current_user: User = Depends(get_current_user)):
-    logger.info(f"Fetching user data for user ID: {current_user.id}")
+    logger.info("Fetching user data for user ID: %s", current_user.id, extra={"sample": "user_data"})
     return await get_user_emails_and_devices(str(current_user.id))
 
 @app.get("/check-verification/{email}")
 async def check_user_verification(email: EmailStr):
-    logger.info(f"Checking verification status for email: {email}")
+    logger.info("Checking verification status for email: %s", email)
     user = await get_user(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"email": email, "is_verified": user.get("is_verified", False)}
 
+# Health endpoints answer from the background prober's last round and never touch a dependency
 @app.get("/health")
 async def health_check():
-    try:
-        await startup_db_client()
-        return {"status": "healthy", "database": "connected"}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return {"status": "unhealthy", "database": "disconnected"}
+    ready, report = health_prober.readiness()
+    mongo_up = report["checks"].get("mongo", {}).get("status") == "up"
+    return {
+        **report,
+        "status": "healthy" if ready else "unhealthy",
+        "readiness": report["status"],
+        "database": "connected" if mongo_up else "disconnected",
+    }
+
+@app.get("/health/live")
+async def liveness_check():
+    alive, report = health_prober.liveness()
+    return JSONResponse(report, status_code=200 if alive else 503)
+
+@app.get("/health/ready")
+async def readiness_check():
+    ready, report = health_prober.readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
@@ -1,22 +1,9 @@
 from fastapi import FastAPI
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from common.security_headers import SecurityHeadersMiddleware
 import secure
 
-secure_headers = secure.Secure.with_default_headers()
-
-class SecureHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        await secure_headers.set_headers_async(response)
-        return response
+# Resolved once at import; the middleware sends the same block on every response
+SECURE_HEADERS = secure.Secure.with_default_headers().headers
 
 def setup_middlewares(app: FastAPI):
-    app.add_middleware(SecureHeadersMiddleware)
-
-    @app.middleware("http")
-    async def log_requests(request: Request, call_next):
-        # You can add request logging here if needed
-        response = await call_next(request)
-        return response
\ No newline at end of file
+    app.add_middleware(SecurityHeadersMiddleware, headers=SECURE_HEADERS)
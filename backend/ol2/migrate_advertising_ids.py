@@ -0,0 +1,39 @@
+"""
+Converts advertising IDs in the devices collection from 36-character strings
+to binary UUIDs. Runs online in small batches and can be stopped and re-run
+at any point.
+
+    python migrate_advertising_ids.py [--batch-size 1000] [--pause 0.1]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.binary_advertising_id import migrate_advertising_ids
+import database
+from logger import logger
+
+async def main(batch_size: int, pause: float):
+    await database.startup_db_client()
+    try:
+        # A second spelling of a user's device is the same device; keep one row
+        migrated, skipped, duplicates = await migrate_advertising_ids(
+            database.device_collection, batch_size, pause, delete_duplicates=True
+        )
+        logger.info(
+            f"Advertising ID migration finished: {migrated} migrated, {skipped} malformed IDs left as strings, "
+            f"{duplicates} duplicate spellings removed"
+        )
+    finally:
+        await database.shutdown_db_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to wait between batches")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.pause))
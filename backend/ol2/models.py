@@ -3,6 +3,7 @@ from datetime import datetime
 import re
 from typing import Optional
 from bson import ObjectId
+from common.advertising_id import validate_advertising_id as is_advertising_id
 
 
 class TimestampModel(BaseModel):
@@ -69,7 +70,7 @@ class DeviceRecord(TimestampModel):
     @field_validator('advertising_id')
     @classmethod
     def validate_advertising_id(cls, v: str) -> str:
-        if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', v.lower()):
+        if not is_advertising_id(v):
             raise ValueError('Invalid advertising ID format')
         return v
 
@@ -89,7 +90,7 @@ class AdvertisingIdAdd(BaseModel):
     @field_validator('advertising_id')
     @classmethod
     def validate_advertising_id(cls, v: str) -> str:
-        if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', v.lower()):
+        if not is_advertising_id(v):
             raise ValueError('Invalid advertising ID format')
         return v
     
@@ -108,7 +109,7 @@ class RegisterInput(BaseModel):
     @field_validator('advertising_id')
     @classmethod
     def validate_advertising_id(cls, v):
-        if v is not None and not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', v.lower()):
+        if v is not None and not is_advertising_id(v):
             raise ValueError('Invalid advertising ID format')
         return v
     
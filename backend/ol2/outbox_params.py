@@ -0,0 +1,29 @@
+import base64
+import hashlib
+import json
+from cryptography.fernet import Fernet
+from config import load_config
+
+config = load_config()
+
+def _fernet(secret: str) -> Fernet:
+    # Derived rather than used as is, so the outbox key differs from the code hashing key
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(b"email-outbox-params:" + secret.encode()).digest()))
+
+# Raises at import, and so at startup, without a secret: params hold one-time codes
+if not config["OUTBOX_PARAMS_SECRET"]:
+    raise ValueError("OUTBOX_PARAMS_SECRET (or CODE_HASH_SECRET / SECRET_KEY) must be set to queue emails")
+_cipher = _fernet(config["OUTBOX_PARAMS_SECRET"])
+
+def encrypt_params(params: dict) -> str:
+    return _cipher.encrypt(json.dumps(params).encode()).decode()
+
+def decrypt_params(value) -> dict:
+    """
+    Raises cryptography.fernet.InvalidToken if value wasn't encrypted with the
+    current secret. Messages queued before params were encrypted are dicts
+    and are returned as they are.
+    """
+    if value is None or isinstance(value, dict):
+        return value or {}
+    return json.loads(_cipher.decrypt(value.encode()))
@@ -0,0 +1,97 @@
+"""
+Drains the email_outbox collection. Run it as its own process next to the API:
+
+    python outbox_worker.py
+"""
+import asyncio
+import os
+import random
+import signal
+import socket
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from cryptography.fernet import InvalidToken
+from database import claim_outbox_email, mark_outbox_sent, mark_outbox_failed, startup_db_client, shutdown_db_client
+from utils import send_verification_email, send_password_reset_email, smtp_pool
+from outbox_params import decrypt_params
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+EMAIL_SENDERS = {
+    "verification": lambda to_email, params: send_verification_email(to_email, params["code"]),
+    "password_reset": lambda to_email, params: send_password_reset_email(to_email, params["code"]),
+}
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter so a failing SMTP server isn't hit in lockstep
+    base = config["OUTBOX_BACKOFF_SECONDS"] * (2 ** (attempts - 1))
+    return base * random.uniform(0.8, 1.2)
+
+async def deliver(message):
+    attempts = message.get("attempts", 0) + 1
+    try:
+        sender = EMAIL_SENDERS[message["kind"]]
+        params = decrypt_params(message.get("params"))
+        await asyncio.to_thread(sender, message["to_email"], params)
+    except Exception as e:
+        # Unknown kinds and params encrypted under another secret won't succeed on retry
+        if attempts >= config["OUTBOX_MAX_ATTEMPTS"] or isinstance(e, (KeyError, InvalidToken)):
+            logger.error(f"Outbox message {message['_id']} dead-lettered after {attempts} attempts: {str(e)}")
+            await mark_outbox_failed(message["_id"], attempts, str(e), None)
+        else:
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+            logger.warning(f"Outbox message {message['_id']} failed (attempt {attempts}), retrying at {retry_at}: {str(e)}")
+            await mark_outbox_failed(message["_id"], attempts, str(e), retry_at)
+        return
+    await mark_outbox_sent(message["_id"])
+
+async def worker_loop(worker_id: str, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            message = await claim_outbox_email(worker_id, config["OUTBOX_LOCK_SECONDS"])
+        except Exception as e:
+            logger.error(f"Outbox worker {worker_id} could not claim a message: {str(e)}")
+            message = None
+        if message is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=config["OUTBOX_POLL_INTERVAL"])
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await deliver(message)
+
+async def run_workers(concurrency: int, stop: asyncio.Event):
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    await asyncio.gather(*(worker_loop(f"{prefix}:{i}", stop) for i in range(concurrency)))
+
+async def reap_idle_connections(stop: asyncio.Event):
+    # Idle SMTP connections are otherwise only closed on the next send
+    interval = max(config["EMAIL_POOL_IDLE_TIMEOUT"] / 2, 1)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(smtp_pool.close_idle)
+
+async def main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await startup_db_client()
+    logger.info(f"Outbox worker started with {config['OUTBOX_WORKERS']} workers")
+    try:
+        await asyncio.gather(run_workers(config["OUTBOX_WORKERS"], stop), reap_idle_connections(stop))
+    finally:
+        smtp_pool.close()
+        await shutdown_db_client()
+
+if __name__ == "__main__":
+    asyncio.run(main())
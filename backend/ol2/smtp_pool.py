@@ -0,0 +1,159 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from logger import logger
+
+
+class SMTPConnectionPool:
+    """
+    Keeps a bounded set of authenticated SMTP connections alive so that each
+    email does not pay for a fresh TCP connect, STARTTLS and login.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str,
+                 max_size: int = 4, idle_timeout: float = 60.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._idle = deque()  # (connection, last_used) pairs, most recently used last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "connections_opened": 0,
+            "connections_reused": 0,
+            "connections_closed_idle": 0,
+            "reconnects": 0,
+            "messages_sent": 0,
+            "send_failures": 0,
+        }
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            self._discard(server)
+            raise
+        with self._lock:
+            self._stats["connections_opened"] += 1
+        return server
+
+    @staticmethod
+    def _discard(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _reap_idle(self, now: float):
+        # Must be called with self._lock held; returns connections to close outside the lock
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._stats["connections_closed_idle"] += len(expired)
+        return expired
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                expired = self._reap_idle(time.monotonic())
+                server = self._idle.pop()[0] if self._idle else None
+                self._in_use += 1
+                if server is not None:
+                    self._stats["connections_reused"] += 1
+            for conn in expired:
+                self._discard(conn)
+            if server is not None:
+                server = self._check_alive(server)
+            return server if server is not None else self._connect()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+            raise
+
+    def _check_alive(self, server):
+        # A pooled connection may have been dropped by the server while idle.
+        # Find out with a NOOP before the message is handed over; any failure
+        # here is safe to answer with a fresh connection, since nothing has
+        # been sent yet.
+        try:
+            code, _ = server.noop()
+            if code != 250:
+                raise smtplib.SMTPServerDisconnected(f"NOOP answered {code}")
+            return server
+        except OSError as e:
+            logger.warning(f"Pooled SMTP connection dropped, reconnecting: {str(e)}")
+            self._discard(server)
+            with self._lock:
+                self._stats["reconnects"] += 1
+            return None
+
+    def _release(self, server, healthy: bool):
+        with self._lock:
+            self._in_use -= 1
+            keep = healthy and not self._closed
+            if keep:
+                self._idle.append((server, time.monotonic()))
+        if not keep and server is not None:
+            self._discard(server)
+        self._slots.release()
+
+    def send_message(self, message):
+        """
+        Sends a message over a pooled connection. Reused connections are
+        checked with a NOOP first and replaced if the server has dropped
+        them. Once the message has been handed over, failures are raised
+        and never retried here, since the server may already have accepted
+        it; the outbox decides whether to try again.
+        """
+        server = self._acquire()
+        try:
+            server.send_message(message)
+        except Exception:
+            with self._lock:
+                self._stats["send_failures"] += 1
+            self._release(server, healthy=False)
+            raise
+        with self._lock:
+            self._stats["messages_sent"] += 1
+        self._release(server, healthy=True)
+
+    def close_idle(self):
+        """
+        Closes connections that have been idle longer than idle_timeout.
+        """
+        with self._lock:
+            expired = self._reap_idle(time.monotonic())
+        for conn in expired:
+            self._discard(conn)
+
+    def close(self):
+        """
+        Closes every idle connection; connections in use are closed on release.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
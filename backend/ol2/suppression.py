@@ -0,0 +1,106 @@
+import asyncio
+import json
+import re
+import tempfile
+from collections import deque
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from bulk_import import iter_lines
+from database import find_opted_out_emails_by_hash
+from email_hashes import HASH_FIELDS, HASH_LENGTHS
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+HEX_PATTERN = re.compile(r"[0-9a-f]+")
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+def parse_hash(line: str):
+    """
+    Returns (algorithm, hash) for a hex SHA-256 or MD5 line, or None. CSV
+    uploads are accepted too; only the first column is read, so a header row
+    is simply counted as invalid.
+    """
+    value = line.split(",", 1)[0].strip().strip('"').lower()
+    algorithm = HASH_LENGTHS.get(len(value))
+    if algorithm is None or not HEX_PATTERN.fullmatch(value):
+        return None
+    return algorithm, value
+
+async def _match_batch(algorithm: str, hashes: list):
+    field = HASH_FIELDS[algorithm]
+    matches = await find_opted_out_emails_by_hash(field, hashes)
+    return [
+        {"hash": match[field], "algorithm": algorithm, "user_id": str(match["user_id"]), "email_id": str(match["_id"])}
+        for match in matches
+    ]
+
+async def match_suppression_list(request: Request):
+    """
+    Joins an uploaded list of hashed emails (one hex SHA-256 or MD5 per line)
+    against the opted-out emails. The upload is read as it streams in and
+    looked up in batches, with at most SUPPRESSION_MATCH_CONCURRENCY batches
+    in flight, so memory stays flat regardless of list size. Matches are
+    spooled to a temporary file (spilling to disk past a few MB) and streamed
+    back as NDJSON, followed by a summary line.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ("text/plain", "text/csv"):
+        raise HTTPException(status_code=415, detail="Upload must be text/plain or text/csv, one hash per line")
+
+    batch_size = config["SUPPRESSION_MATCH_BATCH_SIZE"]
+    concurrency = config["SUPPRESSION_MATCH_CONCURRENCY"]
+    batches = {algorithm: set() for algorithm in HASH_FIELDS}
+    in_flight = deque()
+    results = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    lines = invalid = matched = 0
+
+    async def drain(limit: int):
+        nonlocal matched
+        while len(in_flight) > limit:
+            for match in await in_flight.popleft():
+                results.write(json.dumps(match).encode() + b"\n")
+                matched += 1
+
+    async def submit(algorithm: str):
+        in_flight.append(asyncio.ensure_future(_match_batch(algorithm, list(batches[algorithm]))))
+        batches[algorithm] = set()
+        await drain(concurrency - 1)
+
+    try:
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            lines += 1
+            parsed = parse_hash(line)
+            if parsed is None:
+                invalid += 1
+                continue
+            algorithm, value = parsed
+            batch = batches[algorithm]
+            batch.add(value)
+            if len(batch) >= batch_size:
+                await submit(algorithm)
+        for algorithm, batch in batches.items():
+            if batch:
+                await submit(algorithm)
+        await drain(0)
+    except Exception:
+        for task in in_flight:
+            task.cancel()
+        results.close()
+        raise
+
+    summary = {"lines": lines, "invalid": invalid, "matched": matched}
+    results.write(json.dumps({"summary": summary}).encode() + b"\n")
+    results.seek(0)
+    logger.info(f"Suppression list matched: {summary}")
+
+    def stream():
+        while chunk := results.read(READ_CHUNK_BYTES):
+            yield chunk
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(results.close))
@@ -1,4 +1,3 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config import load_config
@@ -7,9 +6,23 @@ import string
 from datetime import datetime, timedelta
 from jose import jwt
 from logger import logger
+from smtp_pool import SMTPConnectionPool
+from common.metrics import time_downstream, StatsGauges
 
 config = load_config()
 
+smtp_pool = SMTPConnectionPool(
+    config["EMAIL_HOST"],
+    config["EMAIL_PORT"],
+    config["EMAIL_USERNAME"],
+    config["EMAIL_PASSWORD"],
+    max_size=config["EMAIL_POOL_SIZE"],
+    idle_timeout=config["EMAIL_POOL_IDLE_TIMEOUT"],
+)
+
+# Read through the module global so a swapped pool (e.g. in benchmarks) is what gets reported
+StatsGauges("smtp_pool", "SMTP connection pool", lambda: smtp_pool.metrics())
+
 def send_email(to_email: str, subject: str, body: str):
     message = MIMEMultipart()
     message["From"] = config["EMAIL_FROM"]
@@ -18,10 +31,8 @@ def send_email(to_email: str, subject: str, body: str):
     message.attach(MIMEText(body, "plain"))
     
     try:
-        with smtplib.SMTP(config["EMAIL_HOST"], config["EMAIL_PORT"]) as server:
-            server.starttls()
-            server.login(config["EMAIL_USERNAME"], config["EMAIL_PASSWORD"])
-            server.send_message(message)
+        with time_downstream("smtp", "send"):
+            smtp_pool.send_message(message)
         logger.info(f"Email sent successfully to {to_email}")
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+from database import store_verification_code, get_verification_code, delete_verification_code
+from config import load_config
+from logger import logger
+
+config = load_config()
+
+
+class MongoVerificationStore:
+    """
+    Keeps codes in the verification_codes collection; expiry is handled by the
+    TTL index and the resend throttle reads the stored code's created_at.
+    """
+
+    async def store(self, email: str, hashed_code: str, expiration_time: datetime, user_id: str):
+        await store_verification_code(email, hashed_code, expiration_time, user_id)
+
+    async def get(self, email: str):
+        return await get_verification_code(email)
+
+    async def delete(self, email: str):
+        await delete_verification_code(email)
+
+    async def acquire_resend_slot(self, email: str, seconds: int) -> bool:
+        existing_code = await get_verification_code(email)
+        return not (existing_code and (datetime.utcnow() - existing_code["created_at"]) < timedelta(seconds=seconds))
+
+
+class RedisVerificationStore:
+    """
+    Keeps codes in Redis with a key TTL matching the code's expiration and
+    throttles resends with an atomic SET NX EX.
+    """
+
+    def __init__(self, redis_client, prefix: str = "verification"):
+        self.redis = redis_client
+        self.prefix = prefix
+
+    def _code_key(self, email: str) -> str:
+        return f"{self.prefix}:code:{email}"
+
+    def _throttle_key(self, email: str) -> str:
+        return f"{self.prefix}:throttle:{email}"
+
+    async def store(self, email: str, hashed_code: str, expiration_time: datetime, user_id: str):
+        now = datetime.utcnow()
+        ttl = max(int((expiration_time - now).total_seconds()), 1)
+        value = json.dumps({
+            "hashed_code": hashed_code,
+            "expiration_time": expiration_time.isoformat(),
+            "user_id": str(user_id),
+            "created_at": now.isoformat(),
+        })
+        await self.redis.set(self._code_key(email), value, ex=ttl)
+
+    async def get(self, email: str):
+        value = await self.redis.get(self._code_key(email))
+        if value is None:
+            return None
+        record = json.loads(value)
+        record["email"] = email
+        record["expiration_time"] = datetime.fromisoformat(record["expiration_time"])
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        return record
+
+    async def delete(self, email: str):
+        await self.redis.delete(self._code_key(email))
+
+    async def acquire_resend_slot(self, email: str, seconds: int) -> bool:
+        return bool(await self.redis.set(self._throttle_key(email), "1", nx=True, ex=seconds))
+
+
+_store = MongoVerificationStore()
+
+def init_verification_store(redis_client):
+    global _store
+    if config["VERIFICATION_STORE"] == "redis":
+        _store = RedisVerificationStore(redis_client)
+    else:
+        _store = MongoVerificationStore()
+    logger.info(f"Using {type(_store).__name__} for verification codes")
+
+def get_verification_store():
+    return _store
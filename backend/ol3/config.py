@@ -16,6 +16,15 @@ class Settings(BaseSettings):
     CORS_ORIGINS: list[str] = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
     SECRET_KEY: str = os.getenv('SECRET_KEY')
     JWT_SECRET_KEY: str = os.getenv('JWT_SECRET_KEY')
+    SUPABASE_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100"))
+    SUPABASE_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_MAX_KEEPALIVE", "20"))
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost")
+    RATE_LIMIT_TRUSTED_PROXIES: str = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")  # X-Forwarded-For is only read from these
+    RATE_LIMIT_FAIL_OPEN: bool = os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"  # verification routes always refuse while Redis is down
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE: str | None = os.getenv("LOG_FILE")  # unset logs JSON lines to stderr
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")
 
     class Config:
         env_file = ".env"
@@ -3,11 +3,11 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import logging
 from config import settings
+from common.metrics import time_downstream
 import random
 import string
 
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def send_email(to_email: str, subject: str, body: str):
@@ -20,7 +20,7 @@ def send_email(to_email: str, subject: str, body: str):
     try:
         logger.info(f"Attempting to send email to {to_email}")
         logger.info(f"Using SMTP server: {settings.EMAIL_HOST}:{settings.EMAIL_PORT}")
-        with smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
+        with time_downstream("smtp", "send"), smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT) as server:
             logger.info("SMTP connection established")
             server.starttls()
             logger.info("TLS started")
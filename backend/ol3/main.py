@@ -1,28 +1,44 @@
+import os
+import sys
+
+# Make the shared backend/common package importable when running from this directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import create_client, Client
+from postgrest import AsyncPostgrestClient
 import logging
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import redis.asyncio as redis
+from common.rate_limit import RateLimit, init_rate_limiter
+from common.structured_logging import setup_logging, parse_sample_rates
+from common.security_headers import SecurityHeadersMiddleware, DEFAULT_SECURITY_HEADERS
+from common.metrics import setup_metrics
 from datetime import datetime, timedelta, timezone
 from config import settings
 from helpers import send_verification_email, generate_verification_code
 from models import EmailCreate, EmailVerify, DeviceCreate
+from supabase_client import init_supabase_http_client, close_supabase_http_client, get_postgrest_client
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+setup_logging(level=settings.LOG_LEVEL, path=settings.LOG_FILE, sample_rates=parse_sample_rates(settings.LOG_SAMPLE_RATES))
 logger = logging.getLogger(__name__)
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
 security = HTTPBearer()
 
-app = FastAPI()
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_supabase_http_client()
+    init_rate_limiter(
+        redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True),
+        trusted_proxies=settings.RATE_LIMIT_TRUSTED_PROXIES, fail_open=settings.RATE_LIMIT_FAIL_OPEN
+    )
+    yield
+    await close_supabase_http_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,32 +47,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def get_supabase_client() -> Client:
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+app.add_middleware(SecurityHeadersMiddleware, headers=DEFAULT_SECURITY_HEADERS)
+setup_metrics(app)
 
 # Use this function as a dependency in your endpoints
-async def get_authenticated_client(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Client:
-    client = get_supabase_client()
-    client.postgrest.auth(credentials.credentials)
-    return client
+async def get_authenticated_client(credentials: HTTPAuthorizationCredentials = Depends(security)) -> AsyncPostgrestClient:
+    return get_postgrest_client(credentials.credentials)
 
 # Email endpoints
-@app.post("/emails")
-@limiter.limit("5/minute")
-async def add_email(request: Request, email: EmailCreate, client: Client = Depends(get_authenticated_client)):
+@app.post("/emails", dependencies=[Depends(RateLimit("5/minute", fail_open=False))])
+async def add_email(request: Request, email: EmailCreate, client: AsyncPostgrestClient = Depends(get_authenticated_client)):
     try:
-        response = client.table("emails").insert({
+        response = await client.table("emails").insert({
             "email_address": email.email_address,
             "status": "pending",
             "verification_code": generate_verification_code(),
             "verification_code_expires_at": (datetime.now() + timedelta(minutes=5)).isoformat()
         }).execute()
-        
-        if response.error:
-            raise Exception(f"Supabase error: {response.error.message}")
 
-        send_verification_email(email.email_address, response.data[0]["verification_code"])
+        await run_in_threadpool(send_verification_email, email.email_address, response.data[0]["verification_code"])
         
         return {"message": "Email added successfully, verification email sent", "email_id": response.data[0]["id"]}
     except HTTPException as he:
@@ -65,13 +74,10 @@ async def add_email(request: Request, email: EmailCreate, client: Client = Depen
         logger.error(f"Unexpected error in add_email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-@app.post("/emails/verify")
-@limiter.limit("10/minute")
-async def verify_email(request: Request, email_verify: EmailVerify, credentials: HTTPAuthorizationCredentials = Depends(security)):
+@app.post("/emails/verify", dependencies=[Depends(RateLimit("10/minute", fail_open=False))])
+async def verify_email(request: Request, email_verify: EmailVerify, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
     try:
-        supabase_client = get_supabase_client(credentials.credentials)
-        
-        email_record = supabase_client.table("emails").select("*").eq("id", email_verify.email_id).single().execute()
+        email_record = await supabase_client.table("emails").select("*").eq("id", email_verify.email_id).single().execute()
         
         if not email_record.data:
             raise HTTPException(status_code=404, detail="Email not found")
@@ -86,7 +92,7 @@ async def verify_email(request: Request, email_verify: EmailVerify, credentials:
             raise HTTPException(status_code=400, detail="Invalid verification code")
         
         current_time = datetime.now(timezone.utc).isoformat()
-        response = supabase_client.table("emails").update({
+        response = await supabase_client.table("emails").update({
             "status": "active", 
             "verification_code": None,
             "verification_code_expires_at": None,
@@ -100,14 +106,11 @@ async def verify_email(request: Request, email_verify: EmailVerify, credentials:
         logger.error(f"Error in verify_email: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to verify email")
 
-@app.put("/emails/{email_id}/disable")
-@limiter.limit("10/minute")
-async def disable_email(request: Request, email_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+@app.put("/emails/{email_id}/disable", dependencies=[Depends(RateLimit("10/minute"))])
+async def disable_email(request: Request, email_id: str, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
     try:
-        supabase_client = get_supabase_client(credentials.credentials)
-        
         current_time = datetime.now(timezone.utc).isoformat()
-        response = supabase_client.table("emails").update({
+        response = await supabase_client.table("emails").update({
             "status": "disabled",
             "updated_at": current_time
         }).eq("id", email_id).execute()
@@ -121,13 +124,10 @@ async def disable_email(request: Request, email_id: str, credentials: HTTPAuthor
         raise HTTPException(status_code=500, detail="Failed to disable email")
 
 # Device endpoints
-@app.post("/devices")
-@limiter.limit("5/minute")
-async def add_device(request: Request, device: DeviceCreate, credentials: HTTPAuthorizationCredentials = Depends(security)):
+@app.post("/devices", dependencies=[Depends(RateLimit("5/minute"))])
+async def add_device(request: Request, device: DeviceCreate, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
     try:
-        supabase_client = get_supabase_client(credentials.credentials)
-        
-        response = supabase_client.table("devices").insert({
+        response = await supabase_client.table("devices").insert({
             "advertising_id": device.advertising_id,
             "status": "active"
         }).execute()
@@ -136,13 +136,10 @@ async def add_device(request: Request, device: DeviceCreate, credentials: HTTPAu
         logger.error(f"Error in add_device: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to add device")
 
-@app.put("/devices/{device_id}/disable")
-@limiter.limit("10/minute")
-async def disable_device(request: Request, device_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+@app.put("/devices/{device_id}/disable", dependencies=[Depends(RateLimit("10/minute"))])
+async def disable_device(request: Request, device_id: str, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
     try:
-        supabase_client = get_supabase_client(credentials.credentials)
-        
-        response = supabase_client.table("devices").update({"status": "disabled"}).eq("id", device_id).execute()
+        response = await supabase_client.table("devices").update({"status": "disabled"}).eq("id", device_id).execute()
         if not response.data:
             raise HTTPException(status_code=404, detail="Device not found or unauthorized")
         return {"message": "Device disabled successfully"}
@@ -151,17 +148,13 @@ async def disable_device(request: Request, device_id: str, credentials: HTTPAuth
         raise HTTPException(status_code=500, detail="Failed to disable device")
 
 # User data endpoints
-@app.get("/users/me/emails")
-@limiter.limit("30/minute")
-async def get_user_emails(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    supabase_client = get_supabase_client(credentials.credentials)
-    response = supabase_client.table("emails").select("*").execute()
+@app.get("/users/me/emails", dependencies=[Depends(RateLimit("30/minute"))])
+async def get_user_emails(request: Request, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
+    response = await supabase_client.table("emails").select("*").execute()
     return response.data
 
-@app.get("/users/me/devices")
-@limiter.limit("30/minute")
-async def get_user_devices(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    supabase_client = get_supabase_client(credentials.credentials)
-    response = supabase_client.table("devices").select("*").execute()
+@app.get("/users/me/devices", dependencies=[Depends(RateLimit("30/minute"))])
+async def get_user_devices(request: Request, supabase_client: AsyncPostgrestClient = Depends(get_authenticated_client)):
+    response = await supabase_client.table("devices").select("*").execute()
     return response.data
 
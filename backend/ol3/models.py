@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-import re
+from common.advertising_id import validate_advertising_id as is_advertising_id
 
 class EmailCreate(BaseModel):
     email_address: EmailStr
@@ -13,6 +13,6 @@ class DeviceCreate(BaseModel):
 
     @validator('advertising_id')
     def validate_advertising_id(cls, v):
-        if not re.match(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', v, re.I):
+        if not is_advertising_id(v):
             raise ValueError('Invalid advertising ID format')
         return v
\ No newline at end of file
@@ -0,0 +1,56 @@
+import httpx
+from postgrest import AsyncPostgrestClient
+from config import settings
+from common.metrics import time_downstream
+
+# One pooled HTTP client shared by every request; created in the app lifespan
+_http_client: httpx.AsyncClient | None = None
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    # Records each PostgREST call as "<METHOD> <table>" in the downstream latency histogram
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        operation = f"{request.method} {request.url.path.rsplit('/', 1)[-1]}"
+        with time_downstream("supabase", operation):
+            return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def init_supabase_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            transport=TimedTransport(httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_MAX_KEEPALIVE
+            ))),
+            timeout=settings.SUPABASE_TIMEOUT,
+            follow_redirects=True,
+        )
+    return _http_client
+
+async def close_supabase_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_postgrest_client(access_token: str) -> AsyncPostgrestClient:
+    """
+    Returns a PostgREST client scoped to the caller's JWT. It only carries the
+    per-request headers; connections come from the shared pool, so nothing
+    is rebuilt or re-handshaken per request.
+    """
+    return AsyncPostgrestClient(
+        f"{settings.SUPABASE_URL}/rest/v1",
+        headers={
+            "apikey": settings.SUPABASE_KEY,
+            "Authorization": f"Bearer {access_token}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        },
+        http_client=init_supabase_http_client(),
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import httpx
+
+SENDGRID_API_URL = "https://api.sendgrid.com"
+MAX_PERSONALIZATIONS = 1000  # SendGrid's per-request limit
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SendGridTransport:
+    """
+    Async SendGrid v3 client that reuses one HTTP connection pool and merges
+    emails queued within batch_window seconds into a single /v3/mail/send
+    call, one personalization per recipient.
+    """
+
+    def __init__(self, api_key, from_email, subject, html_content,
+                 api_url=SENDGRID_API_URL, batch_window=0.05, timeout=10.0, max_retries=3):
+        self.api_key = api_key
+        self.from_email = from_email
+        self.subject = subject
+        self.html_content = html_content  # may reference per-recipient substitutions
+        self.api_url = api_url.rstrip("/")
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+        self._pending = []
+        self._flush_task = None
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def send(self, to_email, substitutions):
+        """
+        Queues one email and waits for the batch it lands in to be sent.
+        Returns True if SendGrid accepted it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((to_email, substitutions, future))
+        if len(self._pending) >= MAX_PERSONALIZATIONS:
+            self._start_flush(delay=0)
+        elif self._flush_task is None:
+            self._start_flush(delay=self.batch_window)
+        return await future
+
+    def _start_flush(self, delay):
+        batch, self._pending = self._pending, []
+        self._flush_task = asyncio.create_task(self._flush(batch, delay))
+
+    async def _flush(self, batch, delay):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+                # Pick up everything that arrived while we were waiting
+                batch, self._pending = batch + self._pending, []
+            self._flush_task = None
+            for start in range(0, len(batch), MAX_PERSONALIZATIONS):
+                await self._send_chunk(batch[start:start + MAX_PERSONALIZATIONS])
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            # Never leave a caller waiting on a batch that died
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _send_chunk(self, chunk):
+        outcome = await self._post(chunk)
+        if outcome == "rejected" and len(chunk) > 1:
+            # One bad address gets the whole request a 400; retry each
+            # recipient alone so only the bad ones fail
+            outcomes = await asyncio.gather(*(self._post([item]) for item in chunk))
+        else:
+            outcomes = [outcome] * len(chunk)
+        for (_, _, future), outcome in zip(chunk, outcomes):
+            if not future.done():
+                future.set_result(outcome == "sent")
+
+    async def _post(self, chunk):
+        """
+        Posts one request for the chunk, retrying throttling, server errors
+        and network errors. Returns "sent", "rejected" (a 4xx SendGrid
+        won't accept on retry) or "failed".
+        """
+        payload = {
+            "from": {"email": self.from_email},
+            "subject": self.subject,
+            "content": [{"type": "text/html", "value": self.html_content}],
+            "personalizations": [
+                {"to": [{"email": to_email}], "substitutions": substitutions}
+                for to_email, substitutions, _ in chunk
+            ],
+        }
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.post("/v3/mail/send", json=payload)
+                if response.status_code < 300:
+                    print(f"Email batch of {len(chunk)} sent. Status Code: {response.status_code}")
+                    return "sent"
+                if response.status_code not in RETRY_STATUSES:
+                    print(f"Error sending email batch of {len(chunk)}: {response.status_code} {response.text}")
+                    return "rejected" if 400 <= response.status_code < 500 else "failed"
+                error = f"status {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                await asyncio.sleep((2 ** attempt) * 0.2 * random.uniform(0.8, 1.2))
+        print(f"Error sending email batch after {self.max_retries + 1} attempts: {error}")
+        return "failed"
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+# Make the backend modules importable when running pytest from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInSendGrid:
+    """
+    A minimal HTTP/1.1 server on localhost that records every request and
+    answers with whatever respond(request) returns: a status code, or a
+    (status, body) pair. Keeps connections alive like the real API does.
+    """
+
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda request: 202)
+        self.requests = []
+        self.url = None
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                request = {"method": method, "path": path, "headers": headers, "json": json.loads(body) if body else None}
+                self.requests.append(request)
+
+                result = self.respond(request)
+                status, response_body = result if isinstance(result, tuple) else (result, b"")
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Length: {len(response_body)}\r\n\r\n".encode() + response_body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def sendgrid_server():
+    server = StandInSendGrid()
+    await server.start()
+    yield server
+    await server.stop()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from common.binary_advertising_id import migrate_advertising_ids, to_binary_advertising_id
+
+pytestmark = pytest.mark.anyio
+
+AD_ID = "6f9619ff-8b86-d011-b42d-00cf4fc964ff"
+OTHER_AD_ID = "0e984725-c51c-4bf4-9960-e1c80e27aba0"
+
+
+@pytest.fixture
+async def devices():
+    collection = AsyncMongoMockClient().users_db.devices
+    await collection.create_index([("user_id", 1), ("advertising_id", 1)], unique=True)
+    return collection
+
+async def seed_case_variants(devices):
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    await devices.insert_many([
+        {"user_id": user_id, "advertising_id": AD_ID.upper(), "status": "disabled", "updated_at": now - timedelta(days=1)},
+        {"user_id": user_id, "advertising_id": OTHER_AD_ID, "status": "active", "updated_at": now},
+        {"user_id": user_id, "advertising_id": AD_ID, "status": "active", "updated_at": now},
+    ])
+    return user_id
+
+
+async def test_case_variant_duplicates_are_left_as_strings_by_default(devices):
+    await seed_case_variants(devices)
+
+    migrated, skipped, duplicates = await migrate_advertising_ids(devices, batch_size=2, pause=0)
+
+    assert (migrated, skipped, duplicates) == (2, 0, 1)
+    assert await devices.count_documents({"advertising_id": {"$type": "string"}}) == 1
+
+
+async def test_case_variant_duplicates_can_be_removed(devices):
+    user_id = await seed_case_variants(devices)
+
+    migrated, skipped, duplicates = await migrate_advertising_ids(devices, batch_size=2, pause=0, delete_duplicates=True)
+
+    assert (migrated, skipped, duplicates) == (2, 0, 1)
+    assert await devices.count_documents({"advertising_id": {"$type": "string"}}) == 0
+    kept = await devices.find_one({"user_id": user_id, "advertising_id": to_binary_advertising_id(AD_ID)})
+    # The lower-case row was updated more recently, so its status wins
+    assert kept["status"] == "active"
+    assert await devices.count_documents({}) == 2
@@ -0,0 +1,86 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError as RedisConnectionError
+from starlette.requests import Request
+
+from common import rate_limit
+from common.rate_limit import RateLimit, RateLimiter, client_ip, init_rate_limiter
+
+pytestmark = pytest.mark.anyio
+
+
+def make_request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture(autouse=True)
+def reset_limiter():
+    yield
+    rate_limit._limiter = None
+    rate_limit._trusted_proxies = ()
+
+
+async def test_forwarded_for_is_ignored_without_trusted_proxies(redis_client):
+    init_rate_limiter(redis_client)
+    assert client_ip(make_request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+async def test_forwarded_for_is_read_from_trusted_proxies_only(redis_client):
+    init_rate_limiter(redis_client, trusted_proxies="10.0.0.0/8, 127.0.0.1")
+    assert client_ip(make_request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+    # A client-supplied first hop is skipped; the last untrusted hop is the one the proxy saw
+    assert client_ip(make_request("10.0.0.1", "192.0.2.99, 198.51.100.1, 10.2.3.4")) == "198.51.100.1"
+
+
+async def test_leases_never_spend_a_clients_last_tokens(redis_client):
+    limiter = RateLimiter(redis_client, lease_fraction=0.1)
+
+    results = [await limiter.hit("client", 100, 60) for _ in range(110)]
+
+    assert results[:100] == [0] * 100
+    assert all(results[100:])
+    # Leased while far under the limit, one call per request near it
+    assert 20 < limiter.redis_calls < 100
+
+
+async def test_unused_leased_tokens_are_handed_back(redis_client):
+    limiter = RateLimiter(redis_client, lease_fraction=0.1, lease_seconds=0.01)
+
+    assert await limiter.hit("client", 100, 60) == 0
+    await asyncio.sleep(0.02)
+    results = [await limiter.hit("client", 100, 60) for _ in range(110)]
+
+    assert limiter.refunded == 9
+    assert results.count(0) == 99
+
+
+class UnreachableRedis:
+    async def script_load(self, script):
+        raise RedisConnectionError("Connection refused")
+
+
+async def test_redis_errors_fail_open_by_default():
+    assert await RateLimiter(UnreachableRedis()).hit("client", 5, 60) == 0
+
+
+async def test_redis_errors_can_fail_closed():
+    with pytest.raises(RedisConnectionError):
+        await RateLimiter(UnreachableRedis(), fail_open=False).hit("client", 5, 60)
+
+
+async def test_a_route_can_fail_closed_while_others_stay_open():
+    init_rate_limiter(UnreachableRedis())
+    route = type("Route", (), {"path": "/login"})()
+    request = Request({"type": "http", "headers": [], "client": ("203.0.113.7", 50000), "route": route, "path": "/login"})
+
+    await RateLimit("5/minute")(request)
+    with pytest.raises(HTTPException) as refused:
+        await RateLimit("5/minute", fail_open=False)(request)
+    assert refused.value.status_code == 503
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import sendgrid_transport
+from sendgrid_transport import SendGridTransport
+
+pytestmark = pytest.mark.anyio
+
+
+def make_transport(server, **kwargs):
+    return SendGridTransport(
+        "test-key", "noreply@example.com", "Verify your email", "Code: -code-",
+        api_url=server.url, **kwargs
+    )
+
+def recipients(request):
+    return [p["to"][0]["email"] for p in request["json"]["personalizations"]]
+
+
+async def test_close_together_sends_share_one_request(sendgrid_server):
+    transport = make_transport(sendgrid_server)
+    emails = [f"user{i}@example.com" for i in range(5)]
+
+    results = await asyncio.gather(*(transport.send(email, {"-code-": str(i)}) for i, email in enumerate(emails)))
+    await transport.aclose()
+
+    assert results == [True] * 5
+    assert len(sendgrid_server.requests) == 1
+    request = sendgrid_server.requests[0]
+    assert request["path"] == "/v3/mail/send"
+    assert request["headers"]["authorization"] == "Bearer test-key"
+    assert recipients(request) == emails
+    assert request["json"]["personalizations"][3]["substitutions"] == {"-code-": "3"}
+
+
+async def test_batches_split_at_the_personalization_limit(sendgrid_server, monkeypatch):
+    monkeypatch.setattr(sendgrid_transport, "MAX_PERSONALIZATIONS", 2)
+    transport = make_transport(sendgrid_server)
+
+    results = await asyncio.gather(*(transport.send(f"user{i}@example.com", {}) for i in range(5)))
+    await transport.aclose()
+
+    assert results == [True] * 5
+    assert sorted(len(recipients(r)) for r in sendgrid_server.requests) == [1, 2, 2]
+
+
+async def test_throttling_and_server_errors_are_retried(sendgrid_server):
+    statuses = iter([429, 503, 202])
+    sendgrid_server.respond = lambda request: next(statuses)
+    transport = make_transport(sendgrid_server, max_retries=3)
+
+    assert await transport.send("user@example.com", {}) is True
+    await transport.aclose()
+    assert len(sendgrid_server.requests) == 3
+
+
+async def test_gives_up_after_max_retries(sendgrid_server):
+    sendgrid_server.respond = lambda request: 500
+    transport = make_transport(sendgrid_server, max_retries=1)
+
+    assert await transport.send("user@example.com", {}) is False
+    await transport.aclose()
+    assert len(sendgrid_server.requests) == 2
+
+
+async def test_a_rejected_batch_falls_back_to_one_request_per_recipient(sendgrid_server):
+    def respond(request):
+        if "bad@example.com" in recipients(request):
+            return 400, b'{"errors": [{"message": "Invalid email"}]}'
+        return 202
+    sendgrid_server.respond = respond
+    transport = make_transport(sendgrid_server)
+
+    results = await asyncio.gather(
+        transport.send("good1@example.com", {}),
+        transport.send("bad@example.com", {}),
+        transport.send("good2@example.com", {}),
+    )
+    await transport.aclose()
+
+    assert results == [True, False, True]
+    # The batch, then each recipient alone
+    assert len(sendgrid_server.requests) == 4
+
+
+async def test_unexpected_errors_reach_every_caller(sendgrid_server):
+    transport = make_transport(sendgrid_server)
+
+    def broken_client():
+        raise RuntimeError("client unavailable")
+    transport._get_client = broken_client
+
+    results = await asyncio.wait_for(
+        asyncio.gather(transport.send("a@example.com", {}), transport.send("b@example.com", {}), return_exceptions=True),
+        timeout=5
+    )
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert sendgrid_server.requests == []